@@ -0,0 +1,217 @@
+import json
+import sys
+from datetime import datetime, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from board import board_for, get_departure_matrix
+from bus_data import load_configured_model
+from bus_search import SMART_SEARCH, JST, get_japan_now, find_bus_cached, result_cache_stats
+from journey import MAX_TRANSFERS, reachable_within
+
+# ==========================================
+# 🌐 JSON API (不經過 Streamlit)
+# ==========================================
+# GET  /next?start=...&end=...[&time=HH:MM][&route=...]  單筆查詢
+# POST /next/batch  {"queries": [{"start", "end", "time", "route"}, ...]}  批次查詢
+# GET  /board[?start=...][&time=HH:MM]  看板：到其他每一站的下一班車 (同一分鐘共用計算)
+# GET  /reachable?start=...&minutes=N[&time=HH:MM][&transfers=K]  N 分鐘內可抵達的站點
+# GET  /stops  所有站點
+# GET  /stats  查詢結果快取的命中 / 未命中計數
+# GET  /metrics (Prometheus text) 、/metrics.json  各階段耗時與計數 (HAKUBA_METRICS=1 時才有資料)
+# 時刻表在啟動時載入一次，之後全部從記憶體回答。
+MAX_BATCH_SIZE = 1000
+# 請求內容上限：MAX_BATCH_SIZE 筆查詢 (站名以 \uXXXX 跳脫) 約 500 KB，留一倍餘裕
+MAX_BODY_BYTES = 1024 * 1024
+MAX_REACHABLE_MINUTES = 24 * 60
+DEFAULT_PORT = 8600
+
+
+class QueryError(ValueError):
+    """查詢參數錯誤 (回傳 400)"""
+
+
+class BodyTooLarge(QueryError):
+    """請求內容超過 MAX_BODY_BYTES (回傳 413)"""
+
+
+def resolve_time(time_str):
+    """'HH:MM' -> 今天 (日本) 的該時刻；未指定時使用現在時間"""
+    if not time_str:
+        return get_japan_now()
+    try:
+        selected_time = time.fromisoformat(time_str)
+    except (TypeError, ValueError):
+        raise QueryError(f"時間格式錯誤：{time_str!r}，請使用 HH:MM")
+    return datetime.combine(get_japan_now().date(), selected_time).replace(tzinfo=JST)
+
+
+def run_query(model, query):
+    """執行一筆查詢，回傳可直接轉成 JSON 的班次列表"""
+    for field in ("start", "end", "route", "time"):
+        if not isinstance(query.get(field), (str, type(None))):
+            raise QueryError(f"{field} 必須是字串")
+    start_stop, end_stop = query.get("start"), query.get("end")
+    route_selection = query.get("route") or SMART_SEARCH
+    for stop in (start_stop, end_stop):
+        if stop not in model["stop_index"]:
+            raise QueryError(f"找不到站點：{stop!r}")
+    if not route_selection.startswith("🔍") and route_selection not in model["bus_network"]:
+        raise QueryError(f"找不到路線：{route_selection!r}")
+
+    results = find_bus_cached(route_selection, start_stop, end_stop, resolve_time(query.get("time")), model)
+    return [{**bus, 'Sort_Time': bus['Sort_Time'].isoformat()} for bus in results]
+
+
+def run_batch(model, payload):
+    """批次查詢；單筆錯誤只影響該筆，不會讓整批失敗"""
+    queries = payload.get("queries") if isinstance(payload, dict) else None
+    if not isinstance(queries, list):
+        raise QueryError("請提供 queries 陣列")
+    if len(queries) > MAX_BATCH_SIZE:
+        raise QueryError(f"一次最多 {MAX_BATCH_SIZE} 筆查詢")
+
+    answers = []
+    for query in queries:
+        try:
+            if not isinstance(query, dict):
+                raise QueryError("每筆查詢必須是物件")
+            answers.append({"results": run_query(model, query)})
+        except QueryError as e:
+            answers.append({"error": str(e)})
+    return answers
+
+
+def run_board(model, params):
+    """指定 start 時回傳該站看板，否則回傳所有站點的看板"""
+    matrix = get_departure_matrix(model, resolve_time(params.get("time")))
+    start_stop = params.get("start")
+    if start_stop is None:
+        return {"boards": {stop: board_for(matrix, stop) for stop in matrix["stops"]}}
+    if start_stop not in model["stop_index"]:
+        raise QueryError(f"找不到站點：{start_stop!r}")
+    return {"stop": start_stop, "departures": board_for(matrix, start_stop)}
+
+
+def _int_param(params, name, default, low, high):
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise QueryError(f"{name} 必須是整數：{value!r}")
+    if not low <= number <= high:
+        raise QueryError(f"{name} 必須介於 {low} 到 {high}")
+    return number
+
+
+def run_reachable(model, params):
+    """start 出發、minutes 分鐘內可抵達的站點 (最早抵達時間與轉乘次數)"""
+    start_stop = params.get("start")
+    if start_stop not in model["stop_index"]:
+        raise QueryError(f"找不到站點：{start_stop!r}")
+    budget = _int_param(params, "minutes", 60, 0, MAX_REACHABLE_MINUTES)
+    max_transfers = _int_param(params, "transfers", MAX_TRANSFERS, 0, MAX_TRANSFERS)
+    when = resolve_time(params.get("time"))
+    earliest_minute = when.hour * 60 + when.minute + 1
+    with metrics.stage("reachable"):
+        stops = reachable_within(model["connection_table"], start_stop, earliest_minute, budget, max_transfers)
+    return {"stop": start_stop, "minutes": budget, "reachable": stops}
+
+
+def parse_content_length(value, max_bytes=MAX_BODY_BYTES):
+    """Content-Length 標頭 -> 位元組數；非數字或負數視為錯誤，超過 max_bytes 時拋出 BodyTooLarge"""
+    try:
+        length = int(value or 0)
+    except ValueError:
+        raise QueryError(f"Content-Length 格式錯誤：{value!r}")
+    if length < 0:
+        raise QueryError(f"Content-Length 格式錯誤：{value!r}")
+    if length > max_bytes:
+        raise BodyTooLarge(f"請求內容過大：{length} bytes，上限 {max_bytes} bytes")
+    return length
+
+
+def handle_request(model, method, path, query_string="", body=b""):
+    """純函數的路由：回傳 (HTTP 狀態碼, JSON 物件 / 純文字)，方便不開 socket 直接測試"""
+    try:
+        if method == "GET" and path == "/next":
+            params = {k: v[-1] for k, v in parse_qs(query_string).items()}
+            return 200, {"results": run_query(model, params)}
+        if method == "POST" and path == "/next/batch":
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise QueryError("JSON 格式錯誤")
+            return 200, {"results": run_batch(model, payload)}
+        if method == "GET" and path == "/board":
+            params = {k: v[-1] for k, v in parse_qs(query_string).items()}
+            return 200, run_board(model, params)
+        if method == "GET" and path == "/reachable":
+            params = {k: v[-1] for k, v in parse_qs(query_string).items()}
+            return 200, run_reachable(model, params)
+        if method == "GET" and path == "/stops":
+            return 200, {"stops": model["all_stops_combined"], "routes": list(model["bus_network"])}
+        if method == "GET" and path == "/stats":
+            return 200, {"result_cache": result_cache_stats(model)}
+        if method == "GET" and path == "/metrics":
+            return 200, metrics.render_prometheus()
+        if method == "GET" and path == "/metrics.json":
+            return 200, metrics.snapshot()
+        if method == "GET" and path == "/healthz":
+            return 200, {"status": "ok"}
+    except QueryError as e:
+        return 400, {"error": str(e)}
+    return 404, {"error": f"找不到路徑：{method} {path}"}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        try:
+            length = parse_content_length(self.headers.get("Content-Length"))
+        except QueryError as e:
+            # 不讀 body (長度不明或過大)，這條連線後面的資料無法解析，回完錯誤就關閉
+            self.close_connection = True
+            status, payload = 413 if isinstance(e, BodyTooLarge) else 400, {"error": str(e)}
+        else:
+            body = self.rfile.read(length) if length else b""
+            status, payload = handle_request(self.server.model, method, url.path, url.query, body)
+
+        if isinstance(payload, str):
+            data, content_type = payload.encode(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            data, content_type = json.dumps(payload, ensure_ascii=False).encode(), "application/json; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        # 高流量時逐筆寫 stderr 反而是瓶頸
+        pass
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, model=None):
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.model = model if model is not None else load_configured_model()
+    return server
+
+
+# 本機啟動：python api.py [port]
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    server = make_server("0.0.0.0", port)
+    print(f"Hakuba bus API listening on :{port}")
+    server.serve_forever()
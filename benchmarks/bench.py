@@ -0,0 +1,251 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bus_search
+from bus_data import TIMETABLE_VERSION, build_bus_network, build_model
+from bus_search import SMART_SEARCH, JST, get_japan_now, parse_time, find_bus_universal
+from journey import reachable_within
+from timetable import NO_TIME
+
+# ==========================================
+# ⏱️ 效能基準測試
+# ==========================================
+# python benchmarks/bench.py                      執行全部項目並列出結果
+# python benchmarks/bench.py --save               存成 benchmarks/baseline.json
+# python benchmarks/bench.py --compare            與 baseline 比較，變慢時 exit code = 1
+# python benchmarks/bench.py --only search_smart,parse_time
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+REGRESSION_THRESHOLD = 1.25
+SWEEP_TIMES = [(6, 0), (7, 45), (8, 30), (10, 15), (12, 0), (14, 30), (16, 45), (19, 0), (22, 0)]
+
+
+def percentile(sorted_samples, q):
+    """nearest-rank 百分位數"""
+    index = max(0, min(len(sorted_samples) - 1, round(q / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def measure(calls, rounds):
+    """逐次計時 (rounds 輪) 後，再用 tracemalloc 另跑一輪量記憶體配置"""
+    for call in calls:  # 暖身
+        call()
+
+    samples = []
+    for _ in range(rounds):
+        for call in calls:
+            t0 = time.perf_counter_ns()
+            call()
+            samples.append(time.perf_counter_ns() - t0)
+    samples.sort()
+
+    peaks = []
+    tracemalloc.start()
+    for call in calls:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        call()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        "calls": len(samples),
+        "mean_us": round(sum(samples) / len(samples) / 1000, 2),
+        "p50_us": round(percentile(samples, 50) / 1000, 2),
+        "p90_us": round(percentile(samples, 90) / 1000, 2),
+        "p99_us": round(percentile(samples, 99) / 1000, 2),
+        "max_us": round(samples[-1] / 1000, 2),
+        "alloc_peak_kb_mean": round(sum(peaks) / len(peaks) / 1024, 2),
+        "alloc_peak_kb_max": round(max(peaks) / 1024, 2),
+    }
+
+
+# ==========================================
+# 📋 測試項目 (每項回傳一串無參數的呼叫)
+# ==========================================
+def _sweep_times():
+    today = get_japan_now().date()
+    return [datetime(today.year, today.month, today.day, h, m, tzinfo=JST) for h, m in SWEEP_TIMES]
+
+
+def _route_stops(route_data):
+    return list(dict.fromkeys(route_data["stops"] + route_data.get("stops_ret", [])))
+
+
+def case_search_single_route(model):
+    """各路線內所有站點組合 × 一天中的各個時段"""
+    calls = []
+    for route_name, route_data in model["bus_network"].items():
+        stops = _route_stops(route_data)
+        for t in _sweep_times():
+            for a in stops:
+                for b in stops:
+                    calls.append(lambda r=route_name, a=a, b=b, t=t: find_bus_universal(r, a, b, t, model))
+    return calls
+
+
+def case_search_smart(model):
+    """智慧搜尋：全站點兩兩組合 × 各時段"""
+    stops = model["all_stops_combined"]
+    return [
+        lambda a=a, b=b, t=t: find_bus_universal(SMART_SEARCH, a, b, t, model)
+        for t in _sweep_times() for a in stops for b in stops
+    ]
+
+
+def case_search_unknown_start(model):
+    """F6/G7 起點時刻未知 (全列出) 的路徑
+
+    目前資料裡沒有整列空白的站，這裡把 F6 / G7 去程的 Highland Hotel 那一列清空來模擬按鈴站。
+    """
+    unknown = dict(model)
+    unknown["compiled_network"] = dict(model["compiled_network"])
+    start = '白馬ハイランドホテル(Hakuba Highland Hotel)'
+    calls = []
+    for route_name in ("Line-F6 (Highland ⇄ Hakuba47)", "Line-G7 (Highland ⇄ Goryu Iimori)"):
+        south = dict(model["compiled_network"][route_name]["south"])
+        south["minutes"] = south["minutes"].copy()
+        south["minutes"][south["stop_rows"][start]] = NO_TIME
+        unknown["compiled_network"][route_name] = {**model["compiled_network"][route_name], "south": south}
+        for end in model["bus_network"][route_name]["stops"][1:]:
+            for t in _sweep_times():
+                calls.append(lambda r=route_name, b=end, t=t: find_bus_universal(r, start, b, t, unknown))
+    return calls
+
+
+def case_reachable(model):
+    """可到達範圍：各站 × 各時段 × 60 / 180 分鐘預算"""
+    connections = model["connection_table"]
+    return [
+        lambda a=a, t=h * 60 + m, b=b: reachable_within(connections, a, t, b)
+        for h, m in SWEEP_TIMES for a in model["all_stops_combined"] for b in (60, 180)
+    ]
+
+
+def case_build_bus_network(model):
+    """冷啟動：由原始 dict 建立全部 DataFrame"""
+    return [build_bus_network]
+
+
+def case_build_model(model):
+    """冷啟動：原始 dict 編譯矩陣 + 索引 + connection (不經過 pandas)"""
+    return [build_model]
+
+
+def case_parse_time(model):
+    return [lambda s=f"{h:02d}:{m:02d}": parse_time(s) for h in range(6, 24) for m in range(0, 60, 5)]
+
+
+def case_app_render(model):
+    """用 Streamlit AppTest 無頭執行整個 app.py (含按下搜尋)；時鐘依序固定在各時段"""
+    from streamlit.testing.v1 import AppTest
+
+    # AppTest 每次執行都會印 "missing ScriptRunContext"，不影響計時
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    def run(fixed_now):
+        # 畫面內容 (班次數、轉乘方案) 隨時刻而變；固定時鐘，各次量測的工作量才一致
+        with mock.patch.object(bus_search, "get_japan_now", lambda: fixed_now):
+            at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60).run()
+            next(b for b in at.button if "搜尋" in b.label).click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return [lambda t=t: run(t) for t in _sweep_times()]
+
+
+CASES = {
+    "search_single_route": (case_search_single_route, 3),
+    "search_smart": (case_search_smart, 3),
+    "search_unknown_start": (case_search_unknown_start, 20),
+    "reachable": (case_reachable, 5),
+    "build_bus_network": (case_build_bus_network, 20),
+    "build_model": (case_build_model, 20),
+    "parse_time": (case_parse_time, 20),
+    "app_render": (case_app_render, 2),
+}
+
+
+# ==========================================
+# 📈 結果輸出與比較
+# ==========================================
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """回傳 p50 變慢超過 threshold 倍的項目"""
+    regressions = []
+    for name, stats in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base or not base["p50_us"]:
+            continue
+        ratio = stats["p50_us"] / base["p50_us"]
+        stats["vs_baseline"] = round(ratio, 2)
+        if ratio > threshold:
+            regressions.append((name, base["p50_us"], stats["p50_us"], ratio))
+    return regressions
+
+
+def print_table(results):
+    header = f"{'case':<22}{'calls':>8}{'p50 µs':>12}{'p90 µs':>12}{'p99 µs':>12}{'alloc KB':>11}{'vs base':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, s in results["cases"].items():
+        ratio = f"{s['vs_baseline']:.2f}x" if "vs_baseline" in s else "-"
+        print(f"{name:<22}{s['calls']:>8}{s['p50_us']:>12}{s['p90_us']:>12}{s['p99_us']:>12}"
+              f"{s['alloc_peak_kb_mean']:>11}{ratio:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hakuba bus benchmarks")
+    parser.add_argument("--only", help="只跑指定項目 (逗號分隔)")
+    parser.add_argument("--rounds", type=int, help="覆寫每項的計時輪數")
+    parser.add_argument("--save", nargs="?", const=BASELINE_PATH, help="將結果存成 JSON (預設 baseline.json)")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, help="與 baseline JSON 比較")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="p50 變慢幾倍視為退步")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"未知項目：{', '.join(unknown)}")
+
+    model = build_model()
+    results = {
+        "meta": {
+            "timestamp": datetime.now(JST).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timetable_version": TIMETABLE_VERSION,
+        },
+        "cases": {},
+    }
+    for name in names:
+        build_calls, rounds = CASES[name]
+        results["cases"][name] = measure(build_calls(model), args.rounds or rounds)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    print_table(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n已儲存：{args.save}")
+
+    for name, base_p50, p50, ratio in regressions:
+        print(f"⚠️ 效能退步：{name} p50 {base_p50} µs -> {p50} µs ({ratio:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==========================================
+# 🚀 冷啟動時間報告
+# ==========================================
+# python benchmarks/startup.py                    各入口的 import 時間 (前幾大模組) + app 首次 render (固定 09:00，並打開可到達範圍)
+# python benchmarks/startup.py --budget-ms 2000   首次 render 超過預算，或查詢路徑載入了延後的模組時 exit code = 1
+# 每一項都在全新的 Python process 裡量 (python -X importtime)，不受本 process 已載入的模組影響。
+FIRST_RENDER_BUDGET_MS = 2500
+RENDER_REPEATS = 3
+# 首次 render 固定用營運時段內的時刻 (日本時間)：畫面內容 (例如可到達範圍表格) 隨時刻而變，
+# 用真實時鐘的話，延後模組的檢查在收班後會剛好通過
+RENDER_CLOCK = (9, 0)
+
+# 查詢路徑不應載入的重量級模組 (只在匯出 DataFrame / 顯示圖片時才 import)
+DEFERRED_MODULES = ("pandas", "PIL")
+
+ENTRY_POINTS = {
+    "search": "import bus_data, bus_search, journey, board",
+    "api": "import api",
+    "app": "import streamlit, bus_data, bus_search, journey, image_cache, metrics",
+}
+
+_REPORT_LOADED = (
+    "; import sys, json; "
+    f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+)
+
+_FIRST_RENDER = f"""
+import json, logging, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+t1 = time.perf_counter()
+from datetime import datetime, time as clock
+import bus_search
+_today = datetime.now(bus_search.JST).date()
+bus_search.get_japan_now = lambda: datetime.combine(_today, clock{RENDER_CLOCK!r}).replace(tzinfo=bus_search.JST)
+at = AppTest.from_file({os.path.join(ROOT, "app.py")!r}, default_timeout=60).run()
+t2 = time.perf_counter()
+# 再打開可到達範圍：表格也不能載入延後的模組 (不計入首次 render 時間)
+if not at.exception:
+    at.toggle(key="show_reachable").set_value(True).run()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(json.dumps({{
+    "import_ms": (t1 - t0) * 1000, "run_ms": (t2 - t1) * 1000,
+    "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def _run(args):
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args[:3])} 失敗：\n{proc.stderr[-2000:]}")
+    return proc, wall_ms
+
+
+def parse_importtime(stderr):
+    """-X importtime 的輸出 -> [(模組, 深度, self µs, cumulative µs)]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def import_profile(statement):
+    """在全新 process 執行 import，回傳總時間、各頂層模組的耗時與載入的延後模組"""
+    proc, wall_ms = _run(["-X", "importtime", "-c", statement + _REPORT_LOADED])
+    # 只看最外層 (depth 0)：它們的 cumulative 加總就是整段 import 的時間
+    top_level = [(name, cumulative) for name, depth, _, cumulative in parse_importtime(proc.stderr) if depth == 0]
+    top_level.sort(key=lambda x: -x[1])
+    return {
+        "total_ms": round(sum(c for _, c in top_level) / 1000, 1),
+        "wall_ms": round(wall_ms, 1),
+        "modules": [(name, round(c / 1000, 1)) for name, c in top_level],
+        "loaded": json.loads(proc.stdout.strip().splitlines()[-1]),
+    }
+
+
+def first_render(repeats=RENDER_REPEATS):
+    """全新 process 用 AppTest 跑一次 app.py (時鐘固定為 RENDER_CLOCK)；取 repeats 次中最快的一次 (含直譯器啟動)"""
+    best = None
+    for _ in range(repeats):
+        proc, wall_ms = _run(["-c", _FIRST_RENDER])
+        result = {**json.loads(proc.stdout.strip().splitlines()[-1]), "wall_ms": wall_ms}
+        if best is None or result["wall_ms"] < best["wall_ms"]:
+            best = result
+    return {k: (round(v, 1) if isinstance(v, float) else v) for k, v in best.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hakuba bus cold-start report")
+    parser.add_argument("--top", type=int, default=8, help="每個入口列出前幾大的模組")
+    parser.add_argument("--budget-ms", type=float, default=FIRST_RENDER_BUDGET_MS, help="首次 render 的時間預算")
+    parser.add_argument("--skip-render", action="store_true", help="只量 import，不跑 app")
+    parser.add_argument("--json", help="將結果存成 JSON")
+    args = parser.parse_args(argv)
+
+    report = {"imports": {}, "first_render": None, "budget_ms": args.budget_ms}
+    failures = []
+
+    for name, statement in ENTRY_POINTS.items():
+        profile = report["imports"][name] = import_profile(statement)
+        print(f"[{name}] import {profile['total_ms']} ms (process {profile['wall_ms']} ms)  <- {statement}")
+        for module, ms in profile["modules"][:args.top]:
+            print(f"    {ms:>9.1f} ms  {module}")
+        if profile["loaded"]:
+            failures.append(f"{name} 載入了應延後的模組：{', '.join(profile['loaded'])}")
+
+    if not args.skip_render:
+        render = report["first_render"] = first_render()
+        print(f"\n[first render] {render['wall_ms']} ms "
+              f"(streamlit 測試框架 import {render['import_ms']} ms + app.py 執行 {render['run_ms']} ms)")
+        if render["loaded"]:
+            failures.append(f"首次 render 載入了應延後的模組：{', '.join(render['loaded'])}")
+        if render["wall_ms"] > args.budget_ms:
+            failures.append(f"首次 render {render['wall_ms']} ms 超過預算 {args.budget_ms} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for failure in failures:
+        print(f"⚠️ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import numpy as np
+
+import model_cache
+from timetable import NO_TIME, format_minutes
+
+# ==========================================
+# 🪧 看板用：所有站點兩兩之間的下一班車
+# ==========================================
+# 一次向量化計算 stops × stops 的 (出發, 抵達, 班次) 矩陣，
+# 並依 (營運日, 分鐘) 快取；同一分鐘內所有看板共用同一份結果。
+MAX_CACHED_MINUTES = 32
+_NONE = np.iinfo(np.int32).max
+
+
+def _direction_best(compiled, minute):
+    """單一方向：每個 (起點列, 終點列) 在 minute 之後最早出發的班次欄位與時間"""
+    minutes = compiled["minutes"].astype(np.int32)
+    n_rows = minutes.shape[0]
+    dep = np.where(minutes > minute, minutes, _NONE)
+    served = minutes != NO_TIME
+
+    # candidates[i, j, t]：班次 t 從第 i 列出發、且有停第 j 列時的出發時間
+    candidates = np.where(served[None, :, :], dep[:, None, :], _NONE)
+    cols = candidates.argmin(axis=2)
+    best = np.take_along_axis(candidates, cols[..., None], axis=2)[..., 0]
+
+    seq = np.empty(n_rows, dtype=np.int32)
+    for stop, row in compiled["stop_rows"].items():
+        seq[row] = compiled["stop_seq"][stop]
+    best[seq[:, None] >= seq[None, :]] = _NONE
+
+    arrives = minutes[np.arange(n_rows)[None, :], cols]
+    return best, arrives, cols
+
+
+def compute_departure_matrix(model, minute):
+    """計算全部站點兩兩之間、minute (午夜起算分鐘數) 之後的下一班直達車
+
+    結果等同 find_bus_universal 中第一筆起點時刻已知的班次；F6/G7 按鈴站的「現場確認」班次不列入。
+    """
+    stops = model["all_stops_combined"]
+    stop_pos = {stop: i for i, stop in enumerate(stops)}
+    n_stops = len(stops)
+    departs = np.full((n_stops, n_stops), _NONE, dtype=np.int32)
+    arrives = np.full((n_stops, n_stops), NO_TIME, dtype=np.int32)
+    trip = np.full((n_stops, n_stops), -1, dtype=np.int32)
+    trips = []
+
+    for route_name, directions in model["compiled_network"].items():
+        route_data = model["bus_network"][route_name]
+        for direction_key, compiled in directions.items():
+            best, best_arrives, cols = _direction_best(compiled, minute)
+            label = route_data['dir_s'] if direction_key == "south" else route_data['dir_n']
+            offset = len(trips)
+            trips.extend(
+                {'Route': route_name.split(' ')[0], 'Bus_No': bus_no, 'Direction': label}
+                for bus_no in compiled["bus_nos"]
+            )
+
+            rows = np.empty(len(compiled["stop_rows"]), dtype=np.intp)
+            for stop, row in compiled["stop_rows"].items():
+                rows[row] = stop_pos[stop]
+            block = np.ix_(rows, rows)
+            # 只在嚴格更早時覆蓋，同時刻時保留 bus_network 中較前面的路線
+            better = best < departs[block]
+            departs[block] = np.where(better, best, departs[block])
+            arrives[block] = np.where(better, best_arrives, arrives[block])
+            trip[block] = np.where(better, cols + offset, trip[block])
+
+    departs[departs == _NONE] = NO_TIME
+    return {
+        "minute": minute,
+        "stops": stops,
+        "departs": departs.astype(np.int16),
+        "arrives": arrives.astype(np.int16),
+        "trip": trip,
+        "trips": trips,
+    }
+
+
+def get_departure_matrix(model, when):
+    """依 (營運日, 分鐘) 取用快取 (最多 MAX_CACHED_MINUTES 份)"""
+    key = (when.date(), when.hour * 60 + when.minute)
+    status, matrix = model_cache.lookup(model, "departure_matrix_cache", key)
+    if status == "hit":
+        return matrix
+
+    matrix = compute_departure_matrix(model, key[1])
+    model_cache.store(model, "departure_matrix_cache", key, matrix, MAX_CACHED_MINUTES)
+    return matrix
+
+
+def board_for(matrix, start_stop):
+    """單一站點的看板：到其他每一站的下一班車，依出發時間排序"""
+    i = matrix["stops"].index(start_stop)
+    rows = []
+    for j, end_stop in enumerate(matrix["stops"]):
+        dep = int(matrix["departs"][i, j])
+        if dep == NO_TIME:
+            continue
+        rows.append({
+            **matrix["trips"][matrix["trip"][i, j]],
+            'To': end_stop,
+            'Departs': format_minutes(dep),
+            'Arrives': format_minutes(int(matrix["arrives"][i, j])),
+        })
+    rows.sort(key=lambda x: x['Departs'])
+    return rows
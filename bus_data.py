@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+from math import nan
+
+import metrics
+from timetable import compile_network, build_stop_index, load_artifact, artifact_version
+from journey import build_connections
+
+# ==========================================
+# 🛠️ 工具函數
+# ==========================================
+def create_schedule_df(data_dict):
+    # pandas 載入要半秒以上，只有真的要 DataFrame 時才 import (搜尋路徑不需要)
+    import pandas as pd
+    return pd.DataFrame(data_dict).set_index('Stop_Name')
+
+# ==========================================
+# 📊 資料層 (Model)
+# ==========================================
+stops_v2 = ['白馬コルチナ(Cortina)', '里見(Satomi)', '白馬乗鞍(Norikura)', '栂池纜車(Tsugaike Gondola)', '落倉地蔵前(Ochikura Jizo-mae)', '白馬岩岳(Iwatake)', 'JR白馬駅(JR Hakuba Sta.)', '白馬八方巴士總站(Hakuba Bus Terminal)', '八方尾根 (Happo-one)', 'Echoland (Spicy)', 'Hakuba 47', '白馬五竜(Goryu escale plza)']
+stops_vn = ['JR白馬駅(JR Hakuba Sta.)', 'スノーピークランドステーション白馬', '和田野(樅の木ホテル)', '白馬八方巴士總站(Hakuba Bus Terminal)', 'Echoland (Spicy)', 'みそら野ロータリー', 'みそら野入口(セブンイレブン)', '神城 白馬の森入口']
+stops_e3 = ['白馬ハイランドホテル(Hakuba Highland Hotel)', 'JR白馬駅(JR Hakuba Sta.)', 'ホテル白馬(Hotel Hakuba)', '八方尾根 (Happo-one)', '白馬岩岳(Iwatake)']
+stops_f6 = ['白馬ハイランドホテル(Hakuba Highland Hotel)', 'JR白馬駅(JR Hakuba Sta.)', 'けやきの樹(Hotel Keyakino-ki)', 'Hakuba 47']
+stops_g7 = ['白馬ハイランドホテル(Hakuba Highland Hotel)', 'JR白馬駅(JR Hakuba Sta.)', 'ホテル白馬(Hotel Hakuba)', 'みなみ家(Minamiya)', 'ラ ヴィーニュ白馬(La Vigne Hakuba)', 'カルチャード(Cultured)', 'セブンイレブン みそら野(7-11 Misorano)', '十郎の湯(Juro Onsen)', 'エイブル白馬五竜いいもり(Goryu Iimori)']
+
+# V2
+data_v2_s = {'Stop_Name': stops_v2, 'SB_01': [nan]*7 + ['07:31', '07:36', '07:44', '07:59', '08:06'], 'SB_02': [nan]*3 + ['07:48', '07:54', '08:03', nan, '08:11', '08:16', '08:24', '08:39', '08:46'], 'SB_03': ['08:00', '08:08', '08:11', '08:18', '08:24', '08:33', '08:42', '08:48', '08:53', '09:01', '09:16', '09:23'], 'SB_04': [nan]*3 + ['08:33', '08:39', '08:48', nan, '08:56', '09:01', '09:09', '09:24', '09:31'], 'SB_05': ['08:30', '08:38', '08:41', '08:48', '08:54', '09:03', nan, '09:11', '09:16', '09:24', '09:39', '09:46'], 'SB_06': ['09:00', '09:08', '09:11', '09:18', '09:24', '09:33', '09:42', '09:48', '09:53', '10:01', '10:16', '10:23'], 'SB_07': ['09:30', '09:38', '09:41', '09:48', '09:54', '10:03', nan, '10:11', '10:16', '10:24', '10:39', '10:46'], 'SB_08': ['10:00', '10:08', '10:11', '10:18', '10:24', '10:33', '10:42', '10:48', '10:53', '11:01', '11:16', '11:23'], 'SB_09': [nan]*3 + ['10:48', '10:54', '11:03', nan, '11:11', '11:16', '11:24', nan, nan], 'SB_10': ['11:00', '11:08', '11:11', '11:18', '11:24', '11:33', '11:42', '11:48', '11:53', '12:01', nan, '12:23'], 'SB_11': [nan]*3 + ['11:48', '11:54', '12:03', nan, '12:11', '12:16', '12:24', '12:16', nan], 'SB_12': ['12:00', '12:08', '12:11', '12:18', '12:24', '12:33', '12:42', '12:48', '12:53', '13:01', nan, '13:23'], 'SB_13': [nan]*3 + ['12:48', '12:54', '13:03', nan, '13:11', '13:16', '13:24', '13:16', '13:46'], 'SB_14': ['13:00', '13:08', '13:11', '13:18', '13:24', '13:33', '13:42', '13:48', '13:53', '14:01', '13:39', '14:23'], 'SB_15': [nan]*3 + ['13:48', '13:54', '14:03', nan, '14:11', '14:16', '14:24', '14:16', nan], 'SB_16': ['14:00', '14:08', '14:11', '14:18', '14:24', '14:33', '14:42', '14:48', '14:53', '15:01', nan, '15:23'], 'SB_17': [nan]*3 + ['14:33', '14:39', '14:48', nan, '14:56', '15:01', '15:09', '15:16', '15:46'], 'SB_18': ['14:30', '14:38', '14:41', '14:48', '14:54', '15:03', nan, '15:11', '15:16', '15:24', nan, '16:01'], 'SB_19': ['14:45', '14:53', '14:56', '15:03', '15:09', '15:18', '15:42', '15:26', '15:31', '15:39', '15:39', nan], 'SB_20': ['15:00', '15:08', '15:11', '15:18', '15:24', '15:33', '15:42', '15:48', '15:53', '16:01', '16:16', '16:23'], 'SB_21': [nan]*3 + ['15:33', '15:39', '15:48', nan, '15:56', '16:01', '16:09', nan, '16:31'], 'SB_22': ['15:30', '15:38', '15:41', '15:48', '15:54', '16:03', nan, '16:11', '16:16', '16:24', '16:24', '16:46'], 'SB_23': [nan]*3 + ['15:48', '15:54', '16:09', nan, '16:26', '16:31', '16:39', '16:39', '17:01'], 'SB_24': ['16:00', '16:08', '16:11', '16:18', '16:24', '16:33', '16:42', '16:48', '16:53', '17:01', '17:16', '17:23'], 'SB_25': [nan]*3 + ['16:33', '16:39', '16:48', nan, '16:56', '17:01', '17:09', '17:16', '17:31'], 'SB_26': ['16:30', '16:38', '16:41', '16:48', '16:54', '17:03', nan, '17:11', '17:16', '17:24', '17:39', '17:46'], 'SB_27': [nan]*3 + ['17:03', '17:09', '17:18', nan, '17:26', '17:31', '17:39', '17:54', '18:01'], 'SB_28': ['17:00', '17:08', '17:11', '17:18', '17:24', '17:33', '17:42', '17:48', nan, nan, nan, nan]}
+data_v2_n = {'Stop_Name': stops_v2, 'NB_01': ['07:51', '07:43', '07:40', '07:33', '07:27', '07:18', nan, '07:10', nan, nan, nan, nan], 'NB_02': ['08:06', '07:58', '07:55', '07:48', '07:42', '07:33', nan, '07:25', nan, nan, nan, nan], 'NB_03': ['08:28', '08:20', '08:17', '08:10', '08:04', '07:55', '07:46', '07:40', '07:35', '07:27', nan, nan], 'NB_04': [nan]*3 + ['08:18', '08:12', '08:03', nan, '07:55', '07:50', '07:42', nan, nan], 'NB_05': ['08:51', '08:43', '08:40', '08:33', '08:27', '08:18', nan, '08:10', nan, nan, nan, nan], 'NB_06': [nan]*3 + ['08:38', '08:32', '08:23', nan, '08:15', '08:10', '08:02', nan, nan], 'NB_07': ['09:28', '09:20', '09:17', '09:10', '09:04', '08:55', '08:46', '08:40', '08:35', '08:27', nan, '08:07'], 'NB_08': [nan]*3 + ['09:18', '09:12', '09:03', nan, '08:55', '08:50', '08:42', nan, '08:22'], 'NB_09': ['10:01', '09:53', '09:50', '09:43', '09:37', '09:28', '09:46', '09:20', '09:15', '09:07', nan, '08:47'], 'NB_10': [nan]*3 + ['10:10', '10:04', '09:55', nan, '09:40', '09:35', '09:27', nan, nan], 'NB_11': [nan]*3 + ['10:18', '10:12', '10:03', nan, '09:55', '09:50', '09:42', nan, nan], 'NB_12': ['10:36', '10:28', '10:25', '10:33', '10:27', '10:18', '10:46', '10:10', '10:05', '09:57', nan, '09:22'], 'NB_13': [nan, nan, '11:17', '11:10', '11:04', '10:55', nan, '10:40', '10:35', '10:27', '10:00', '10:07'], 'NB_14': [nan]*3 + ['11:33', '11:27', '11:18', nan, '11:10', '11:05', '10:57', nan, nan], 'NB_15': ['11:28', '11:20', '11:17', '12:10', '12:04', '11:55', '11:46', '11:40', '11:35', '11:27', '11:00', '11:07'], 'NB_16': [nan]*3 + ['12:33', '12:27', '12:18', nan, '12:10', '12:05', '11:57', nan, nan], 'NB_17': ['12:28', '12:20', '12:17', '13:10', '13:04', '12:55', '12:46', '12:40', '12:35', '12:27', '12:00', '12:07'], 'NB_18': [nan, nan, '13:17', '13:33', '13:27', '13:18', nan, '13:10', '13:05', '12:57', '12:30', '12:37'], 'NB_19': ['13:28', '13:20', '13:17', '14:10', '14:04', '13:55', '13:46', '13:40', '13:35', '13:27', '13:00', '13:07'], 'NB_20': [nan, nan, '14:17', '14:33', '14:27', '14:18', nan, '14:10', '14:05', '13:57', '13:30', '13:37'], 'NB_21': ['14:28', '14:20', '14:17', '15:10', '15:04', '14:55', '14:46', '14:40', '14:35', '14:27', '14:00', '14:07'], 'NB_22': [nan, nan, '15:17', '15:33', '15:27', '15:18', nan, '15:10', '15:05', '14:57', '14:30', '14:37'], 'NB_23': ['15:28', '15:20', '15:17', '16:10', '16:04', '15:55', '15:46', '15:40', '15:35', '15:27', '15:00', '15:07'], 'NB_24': [nan, nan, '16:17', '16:33', '16:27', '16:18', nan, '16:10', '16:05', '15:57', '15:30', '15:37'], 'NB_25': ['16:28', '16:20', '16:17', '17:10', '17:04', '16:55', '16:46', '16:40', '16:35', '16:27', '16:00', '16:07'], 'NB_26': [nan, '17:20', '17:17', '17:10', '17:04', '16:55', nan, '16:46', '16:50', '16:42', '16:15', '16:22'], 'NB_27': ['17:28', '17:20', '17:17', '17:33', '17:27', '17:18', '17:46', '17:10', '17:05', '16:57', '16:30', '16:37'], 'NB_28': [nan, nan, nan, nan, nan, nan, '17:46', '17:40', '17:35', '17:27', '17:00', '17:07']}
+
+# VN
+data_vn_to = {'Stop_Name': stops_vn, 'VN_1': ['17:24', '17:29', '17:35', '17:50', '17:55', '17:58', '18:04', nan], 'VN_2': ['18:49', '18:54', '19:00', '19:15', '19:20', '19:23', '19:29', '19:37'], 'VN_3': ['21:05', '21:10', '21:16', '21:31', '21:36', '21:39', '21:45', nan], 'VN_4': ['22:25', '22:30', '22:36', '22:46', '22:51', '22:54', '23:00', '23:08']}
+data_vn_back = {'Stop_Name': stops_vn, 'VN_In_1': ['17:24', '17:19', '17:13', '17:08', '16:53', '16:50', '16:44', '16:36'], 'VN_In_2': ['18:49', '18:44', '18:38', '18:33', '18:18', '18:15', '18:09', nan], 'VN_In_3': ['21:05', '21:00', '20:54', '20:49', '20:34', '20:31', '20:25', '20:17'], 'VN_In_4': ['22:25', '22:20', '22:14', '22:09', '21:59', '21:56', '21:50', nan]}
+
+# E3
+data_e3_out = {'Stop_Name': stops_e3, 'E3_1': ['08:05', '08:13', '08:18', '08:23', '08:36'], 'E3_2': ['09:05', '09:13', '09:18', '09:23', '09:36'], 'E3_3': ['10:05', '10:13', '10:18', '10:23', '10:36']}
+stops_e3_ret = list(reversed(stops_e3))
+data_e3_ret = {'Stop_Name': stops_e3_ret, 'E3_1': ['14:00', '14:13', '14:18', '14:23', '14:31'], 'E3_2': ['15:00', '15:13', '15:18', '15:23', '15:31'], 'E3_3': ['16:00', '16:13', '16:18', '16:23', '16:31']}
+
+# F6
+data_f6_out = {'Stop_Name': stops_f6, 'F6_1': ['08:15', '08:20', '08:30', '08:44'], 'F6_2': ['09:15', '09:20', '09:30', '09:44'], 'F6_3': [nan, '12:00', '12:10', '12:24']}
+stops_f6_ret = list(reversed(stops_f6))
+data_f6_ret = {'Stop_Name': stops_f6_ret, 'F6_1': ['15:00', '15:14', '15:24', '15:29'], 'F6_2': ['16:00', '16:14', '16:24', '16:29']}
+
+# G7
+data_g7_out = {'Stop_Name': stops_g7, 'G7_1': ['08:00', '08:05', '08:09', '08:13', '08:16', '08:19', '08:21', '08:26', '08:30'], 'G7_2': ['09:00', '09:05', '09:09', '09:13', '09:16', '09:19', '09:21', '09:26', '09:30'], 'G7_3': ['10:00', '10:05', '10:09', '10:13', '10:16', '10:19', '10:21', '10:26', '10:30'], 'G7_4': ['12:30', '12:35', '12:39', '12:43', '12:46', '12:49', '12:51', '12:56', '13:00']}
+stops_g7_ret = list(reversed(stops_g7))
+data_g7_ret = {'Stop_Name': stops_g7_ret, 'G7_1': ['12:00', '12:04', '12:09', '12:11', '12:14', '12:17', '12:21', '12:25', '12:30'], 'G7_2': ['15:00', '15:04', '15:09', '15:11', '15:14', '15:17', '15:21', '15:25', '15:30'], 'G7_3': ['16:00', '16:04', '16:09', '16:11', '16:14', '16:17', '16:21', '16:25', '16:30'], 'G7_4': ['17:10', '17:14', '17:19', '17:21', '17:24', '17:27', '17:31', '17:35', '17:40']}
+
+# --- 建立總表 ---
+ROUTES = {
+    "Line-V2 (Cortina ⇄ Goryu)": {
+        "stops": stops_v2,
+        "south": data_v2_s, "north": data_v2_n,
+        "dir_s": "往五龍(Goryu)方面", "dir_n": "往 Cortina 方面"
+    },
+    "Line-VN (Night Shuttle)": {
+        "stops": stops_vn,
+        "south": data_vn_to, "north": data_vn_back,
+        "dir_s": "往神城方面", "dir_n": "往JR白馬駅方面"
+    },
+    "Line-E3 (Highland ⇄ Iwatake)": {
+        "stops": stops_e3, "stops_ret": stops_e3_ret,
+        "south": data_e3_out, "north": data_e3_ret,
+        "dir_s": "往岩岳(Iwatake)方面", "dir_n": "往 Highland Hotel 方面"
+    },
+    "Line-F6 (Highland ⇄ Hakuba47)": {
+        "stops": stops_f6, "stops_ret": stops_f6_ret,
+        "south": data_f6_out, "north": data_f6_ret,
+        "dir_s": "往 Hakuba 47 方面", "dir_n": "往 Highland Hotel 方面"
+    },
+    "Line-G7 (Highland ⇄ Goryu Iimori)": {
+        "stops": stops_g7, "stops_ret": stops_g7_ret,
+        "south": data_g7_out, "north": data_g7_ret,
+        "dir_s": "往五龍 Iimori 方面", "dir_n": "往 Highland Hotel 方面"
+    }
+}
+
+
+def timetable_version(routes):
+    """整份總表 (路線順序、站序、時刻、方向名稱) 的指紋：任何一項改動，快取鍵就跟著變"""
+    return hashlib.sha1(json.dumps(routes, ensure_ascii=False, default=str).encode()).hexdigest()[:12]
+
+
+TIMETABLE_VERSION = timetable_version(ROUTES)
+
+
+def build_bus_network():
+    """各方向時刻表轉成 DataFrame 的 bus_network (檢視 / 匯出用；搜尋只用編譯後的矩陣)"""
+    return {
+        route_name: {
+            **route_data,
+            "south": create_schedule_df(route_data["south"]),
+            "north": create_schedule_df(route_data["north"]),
+        }
+        for route_name, route_data in ROUTES.items()
+    }
+
+
+def build_model():
+    """建立整份資料模型 (編譯矩陣、索引、connection)；由呼叫端負責快取
+
+    與 load_artifact_model 相同，bus_network 只含站點與方向名稱，不建立 DataFrame。
+    """
+    metrics.inc("model_builds_total")
+    with metrics.stage("model_build"):
+        bus_network = {
+            route_name: {k: v for k, v in route_data.items() if k not in ("south", "north")}
+            for route_name, route_data in ROUTES.items()
+        }
+        # 原始 dict 直接編譯成整數分鐘矩陣 (不經過 pandas)
+        compiled_network = compile_network(ROUTES)
+        return {
+            "bus_network": bus_network,
+            "compiled_network": compiled_network,
+            "stop_index": build_stop_index(compiled_network),
+            # 轉乘規劃用：依出發時間排序的 connection 陣列
+            "connection_table": build_connections(bus_network, compiled_network),
+            "all_stops_combined": list(dict.fromkeys(stops_v2 + stops_vn + stops_e3 + stops_f6 + stops_g7)),
+        }
+
+# ==========================================
+# 💾 外部時刻表檔 (timetable_import.py 產生)
+# ==========================================
+# 設定 HAKUBA_TIMETABLE=<資料夾> 時改用 mmap 載入的時刻表，不建立 DataFrame
+TIMETABLE_ARTIFACT = os.environ.get("HAKUBA_TIMETABLE")
+
+
+def load_artifact_model(path):
+    """由時刻表檔建立資料模型 (與 build_model 相同的結構，bus_network 不含 DataFrame)"""
+    metrics.inc("model_builds_total")
+    with metrics.stage("model_load"):
+        bus_network, compiled_network, _ = load_artifact(path)
+        return {
+            "bus_network": bus_network,
+            "compiled_network": compiled_network,
+            "stop_index": build_stop_index(compiled_network),
+            "connection_table": build_connections(bus_network, compiled_network),
+            "all_stops_combined": list(dict.fromkeys(
+                stop for route_data in bus_network.values() for stop in route_data["stops"] + route_data["stops_ret"]
+            )),
+        }
+
+
+def configured_timetable_version():
+    """目前使用中的時刻表版本 (快取鍵)"""
+    return artifact_version(TIMETABLE_ARTIFACT) if TIMETABLE_ARTIFACT else TIMETABLE_VERSION
+
+
+def load_configured_model():
+    return load_artifact_model(TIMETABLE_ARTIFACT) if TIMETABLE_ARTIFACT else build_model()
+
+# ==========================================
+# 🖼️ 圖片對應
+# ==========================================
+image_map = {
+    "Line-V2 (Cortina ⇄ Goryu)": {
+        "files": ["V2_toSouth.webp", "V2_toNorth.webp"],
+        "desc": ["去程 (往五龍)", "回程 (往 Cortina)"]
+    },
+    "Line-VN (Night Shuttle)": {
+        "files": ["line-hv_to.webp", "line-hv_back.webp"],
+        "desc": ["Outbound (往神城)", "Inbound (往白馬駅)"]
+    },
+    "Line-E3 (Highland ⇄ Iwatake)": {
+        "files": ["line_E3_outward.webp", "line_E3_return.webp"],
+        "desc": ["去程 (往岩岳)", "回程 (往 Highland Hotel)"]
+    },
+    "Line-F6 (Highland ⇄ Hakuba47)": {
+        "files": ["line_F6_outward.webp", "line_F6_return.webp"],
+        "desc": ["去程 (往 Hakuba 47)", "回程 (往 Highland Hotel)"]
+    },
+    "Line-G7 (Highland ⇄ Goryu Iimori)": {
+        "files": ["line_G7_outward.webp", "line_G7_return.webp"],
+        "desc": ["去程 (往五龍 Iimori)", "回程 (往 Highland Hotel)"]
+    }
+}
@@ -0,0 +1,178 @@
+import threading
+from datetime import datetime, time, timedelta, timezone
+from time import monotonic as monotonic_time, time as wall_time
+
+import metrics
+import model_cache
+from timetable import matching_directions, is_row_empty, next_departures, arrivals_at, format_minutes
+
+# 智慧搜尋 (所有路線) 的選項名稱；以 "🔍" 開頭即代表不限路線
+SMART_SEARCH = "🔍 所有路線 (智慧搜尋)"
+
+# ==========================================
+# 🕒 時區設定
+# ==========================================
+JST = timezone(timedelta(hours=9))
+
+def get_japan_now():
+    return datetime.now(JST)
+
+# ==========================================
+# 🛠️ 工具函數
+# ==========================================
+def parse_time(time_str):
+    try:
+        japan_today = get_japan_now().date()
+        if isinstance(time_str, str):
+            return datetime.strptime(f"{japan_today} {time_str}", "%Y-%m-%d %H:%M").replace(tzinfo=JST)
+        else:
+            return datetime.combine(japan_today, time_str).replace(tzinfo=JST)
+    except (ValueError, TypeError):
+        return None
+
+# ==========================================
+# 🧠 核心搜尋邏輯
+# ==========================================
+def find_bus_universal(route_selection, start_stop, end_stop, current_time, model):
+    if start_stop == end_stop: return []
+
+    bus_network = model["bus_network"]
+    compiled_network = model["compiled_network"]
+
+    all_results = []
+
+    # 時間只換算一次：今天 (日本) 午夜起算的秒數
+    if current_time.tzinfo is None:
+        current_time = current_time.replace(tzinfo=JST)
+    today_midnight = datetime.combine(get_japan_now().date(), time(0)).replace(tzinfo=JST)
+    after_seconds = (current_time - today_midnight).total_seconds()
+
+    # 1. 方向判定：由反查索引只取同時停靠兩站的路線
+    only_route = None if route_selection.startswith("🔍") else route_selection
+    with metrics.stage("direction"):
+        matches = matching_directions(model["stop_index"], start_stop, end_stop, only_route)
+
+    for route_name, direction_key in matches:
+        route_data = bus_network[route_name]
+        direction_label = route_data['dir_s'] if direction_key == "south" else route_data['dir_n']
+        compiled = compiled_network[route_name][direction_key]
+
+        # 2. 判斷是否為無時刻站點 (全列出模式)
+        is_estimated_line = ("Line-F6" in route_name) or ("Line-G7" in route_name)
+        is_start_time_unknown = is_estimated_line and is_row_empty(compiled, start_stop)
+
+        # 3. 搜尋班次 (整數分鐘矩陣向量化篩選)
+        with metrics.stage("trip_scan", route=route_name.split(' ')[0]):
+            end_row = compiled["minutes"][compiled["stop_rows"][end_stop]]
+            if is_start_time_unknown:
+                for col in arrivals_at(compiled, end_stop):
+                    end_min = int(end_row[col])
+                    all_results.append({
+                        'Route': route_name.split(' ')[0],
+                        'Bus_No': compiled["bus_nos"][col],
+                        'Departs': '現場確認',
+                        'Arrives': format_minutes(end_min),
+                        'Wait_Time': '請提早候車',
+                        'Direction': direction_label,
+                        'Sort_Time': today_midnight + timedelta(minutes=end_min),
+                        'Is_Estimated': True,
+                        'Is_Unknown_Start': True
+                    })
+                continue
+
+            start_row = compiled["minutes"][compiled["stop_rows"][start_stop]]
+            for col in next_departures(compiled, start_stop, end_stop, after_seconds):
+                start_min, end_min = int(start_row[col]), int(end_row[col])
+                bus_time = today_midnight + timedelta(minutes=start_min)
+                wait_time = (bus_time - current_time).seconds // 60
+
+                all_results.append({
+                    'Route': route_name.split(' ')[0],
+                    'Bus_No': compiled["bus_nos"][col],
+                    'Departs': format_minutes(start_min),
+                    'Arrives': format_minutes(end_min),
+                    'Wait_Time': f"{wait_time} 分鐘",
+                    'Direction': direction_label,
+                    'Sort_Time': bus_time,
+                    'Is_Estimated': is_estimated_line,
+                    'Is_Unknown_Start': False
+                })
+
+    with metrics.stage("sort"):
+        all_results.sort(key=lambda x: x['Sort_Time'])
+    return all_results
+
+# ==========================================
+# 🗃️ 查詢結果快取 (同一分鐘內共用)
+# ==========================================
+# 鍵 = (路線, 起點, 終點, 查詢時間截到分鐘, 營運日)；項目在下一個整分鐘過期。
+# 班次篩選只看到分鐘，秒數只影響等候時間，命中時依實際時間重算即可。
+RESULT_CACHE_SIZE = 512
+_stats_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+
+def _with_wait_time(results, current_time):
+    """複製結果並依實際查詢時間重算等候分鐘 (避免呼叫端改到快取內容)"""
+    refreshed = []
+    for bus in results:
+        bus = dict(bus)
+        if not bus['Is_Unknown_Start']:
+            bus['Wait_Time'] = f"{(bus['Sort_Time'] - current_time).seconds // 60} 分鐘"
+        refreshed.append(bus)
+    return refreshed
+
+
+def find_bus_cached(route_selection, start_stop, end_stop, current_time, model):
+    """find_bus_universal 的快取版本 (model_cache，最多 RESULT_CACHE_SIZE 筆)"""
+    if not metrics.ENABLED:
+        return _cached_search(route_selection, start_stop, end_stop, current_time, model)[0]
+
+    route = metrics.route_label(route_selection)
+    with metrics.stage("query", route=route):
+        results, is_hit = _cached_search(route_selection, start_stop, end_stop, current_time, model)
+    metrics.inc("queries_total", route=route)
+    metrics.inc("cache_hits_total" if is_hit else "cache_misses_total", route=route)
+    metrics.inc("results_returned_total", len(results), route=route)
+    if not results:
+        metrics.inc("empty_results_total", route=route)
+    return results
+
+
+def _cached_search(route_selection, start_stop, end_stop, current_time, model):
+    """回傳 (結果, 是否命中快取)"""
+    if current_time.tzinfo is None:
+        current_time = current_time.replace(tzinfo=JST)
+    query_minute = current_time.astimezone(JST).replace(second=0, microsecond=0)
+    key = (route_selection, start_stop, end_stop, query_minute, get_japan_now().date())
+    now = monotonic_time()
+
+    status, results = model_cache.lookup(model, "result_cache", key, now)
+    with _stats_lock:
+        if status == "hit":
+            _cache_stats["hits"] += 1
+        else:
+            _cache_stats["misses"] += 1
+            if status == "expired":
+                _cache_stats["expired"] += 1
+    if status == "hit":
+        return _with_wait_time(results, current_time), True
+
+    results = find_bus_universal(route_selection, start_stop, end_stop, query_minute, model)
+    # 下一個整分鐘 (牆上時鐘) 過期
+    expires_at = now + 60 - wall_time() % 60
+
+    evicted = model_cache.store(model, "result_cache", key, results, RESULT_CACHE_SIZE, expires_at)
+    if evicted:
+        with _stats_lock:
+            _cache_stats["evictions"] += evicted
+    return _with_wait_time(results, current_time), False
+
+
+def result_cache_stats(model=None):
+    """命中 / 未命中等計數；給 model 時一併回報目前快取筆數"""
+    with _stats_lock:
+        stats = dict(_cache_stats)
+    if model is not None:
+        stats["size"] = model_cache.size(model, "result_cache")
+    return stats
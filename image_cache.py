@@ -0,0 +1,119 @@
+import hashlib
+import os
+import sys
+import tempfile
+
+# ==========================================
+# 🖼️ 時刻表圖片縮圖快取
+# ==========================================
+# 原圖依寬度分成幾個尺寸，存在磁碟上；
+# 檔名以原圖內容的 hash 開頭，原圖一改就自動失效。
+# 總容量超過上限時，依最後使用時間 (mtime) 淘汰最舊的檔案 (LRU)。
+VARIANT_WIDTHS = (480, 960, 1440)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".image_cache")
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def source_hash(img_path):
+    """原圖內容的 hash (快取鍵)"""
+    with open(img_path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+
+def _save_atomic(image, path):
+    """先寫暫存檔再 rename，多個 worker 同時產生也不會讀到半張圖"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        image.save(tmp_path, format="WEBP", quality=80)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _touch(path):
+    """更新 mtime 作為 LRU 的最後使用時間"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def build_variants(img_path, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """產生 (或沿用) 各尺寸縮圖，回傳 {"widths": {寬度: path}}
+
+    比原圖還寬的尺寸不產生，直接由原圖負責。
+    """
+    # PIL 只在第一次顯示圖片時才載入，不拖慢 worker 冷啟動
+    from PIL import Image
+
+    os.makedirs(cache_dir, exist_ok=True)
+    key = source_hash(img_path)
+
+    with Image.open(img_path) as source:
+        source_width, source_height = source.size
+        variant_paths = {
+            w: os.path.join(cache_dir, f"{key}_{w}.webp") for w in VARIANT_WIDTHS if w < source_width
+        }
+        missing = [p for p in variant_paths.values() if not os.path.exists(p)]
+        if missing:
+            source.load()
+            for width, path in variant_paths.items():
+                if path in missing:
+                    height = round(source_height * width / source_width)
+                    _save_atomic(source.resize((width, height), Image.LANCZOS), path)
+            evict(cache_dir, max_bytes)
+
+    for path in variant_paths.values():
+        _touch(path)
+    return {"widths": variant_paths}
+
+
+def pick_variant(variants, img_path, display_width):
+    """回傳足夠填滿 display_width 的最小尺寸；都不夠寬 (或已被淘汰) 時回傳原圖"""
+    for width in sorted(variants["widths"]):
+        if width >= display_width:
+            path = variants["widths"][width]
+            if not os.path.exists(path):
+                break
+            _touch(path)
+            return path
+    return img_path
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """總容量超過 max_bytes 時，從最久沒用的檔案開始刪除"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith(".webp") and os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+# 部署前預先產生所有縮圖：python image_cache.py [圖片資料夾]
+if __name__ == "__main__":
+    from bus_data import image_map
+
+    base_path = sys.argv[1] if len(sys.argv) > 1 else "."
+    for config in image_map.values():
+        for filename in config["files"]:
+            img_path = os.path.join(base_path, filename)
+            if not os.path.exists(img_path):
+                print(f"找不到圖片：{img_path}")
+                continue
+            variants = build_variants(img_path)
+            print(filename, "->", ", ".join(str(w) for w in variants["widths"]) or "(原圖)")
@@ -0,0 +1,210 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from timetable import NO_TIME, format_minutes
+
+# ==========================================
+# 🔁 轉乘規劃 (Connection Scan)
+# ==========================================
+# 每個班次上「可直接搭乘的每一對站點」都是一筆 connection (與直達搜尋的判定相同)，
+# 依出發時間排序後存成陣列；一筆 connection 就是一段完整的乘車，不必沿班次逐站接續。
+# 每一輪掃描多允許一次轉乘，得到 (抵達時間, 轉乘次數) 的 Pareto 最佳解。
+MIN_TRANSFER_MINUTES = 5
+MAX_TRANSFERS = 2
+INF = 10 ** 6
+
+
+def build_connections(bus_network, compiled_network):
+    """由編譯後的時刻表建立依出發時間排序的 connection 陣列"""
+    stops = []
+    stop_ids = {}
+    trips = []
+    rows = []  # (dep, arr, from_id, to_id, trip_id)
+
+    for route_name, directions in compiled_network.items():
+        route_data = bus_network[route_name]
+        for direction_key, compiled in directions.items():
+            label = route_data['dir_s'] if direction_key == "south" else route_data['dir_n']
+            ordered = sorted(compiled["stop_seq"], key=compiled["stop_seq"].get)
+            for stop in ordered:
+                if stop not in stop_ids:
+                    stop_ids[stop] = len(stops)
+                    stops.append(stop)
+            ordered_rows = [compiled["stop_rows"][stop] for stop in ordered]
+            minutes = compiled["minutes"][ordered_rows]
+
+            for col, bus_no in enumerate(compiled["bus_nos"]):
+                trip_id = len(trips)
+                trips.append({
+                    'Route': route_name.split(' ')[0],
+                    'Bus_No': bus_no,
+                    'Direction': label,
+                })
+                served = [(ordered[i], int(t)) for i, t in enumerate(minutes[:, col]) if t != NO_TIME]
+                # 原始時刻表有少數時間倒退的格子 (例如 V2 NB_09 JR 白馬駅)。只串相鄰兩站的話，
+                # 班次會在那裡斷掉；改為每一對站點各自成一筆，只略過抵達早於出發的組合
+                for i, (from_stop, dep) in enumerate(served):
+                    for to_stop, arr in served[i + 1:]:
+                        if arr >= dep:
+                            rows.append((dep, arr, stop_ids[from_stop], stop_ids[to_stop], trip_id))
+
+    table = np.array(sorted(rows), dtype=np.int32).reshape(-1, 5)
+    return {
+        "dep": table[:, 0], "arr": table[:, 1],
+        "from": table[:, 2], "to": table[:, 3], "trip": table[:, 4],
+        # 純 Python list 版本：逐筆掃描時比 NumPy 純量存取快很多
+        "rows": table.tolist(),
+        "dep_list": table[:, 0].tolist(),
+        "stops": stops,
+        "stop_ids": stop_ids,
+        "trips": trips,
+    }
+
+
+def scan_rounds(connections, origin, earliest_minute, max_transfers, min_transfer, target=None):
+    """逐輪 Connection Scan；回傳每一輪的 (抵達時間, 上一段指標) 陣列
+
+    第 k 輪的 arrival[s] 為最多 k 次轉乘抵達 s 的最早時間，
+    parent[s] = (輪次, connection)；每筆 connection 是一段完整乘車，
+    所以第 k 輪只從第 k-1 輪已抵達的站上車。
+    """
+    rows = connections["rows"]
+    n_stops = len(connections["stops"])
+    first = bisect_left(connections["dep_list"], earliest_minute)
+
+    prev = [INF] * n_stops
+    prev[origin] = earliest_minute
+    prev_parent = [None] * n_stops
+    rounds = []
+
+    for k in range(max_transfers + 1):
+        cur = list(prev)
+        parent = list(prev_parent)
+        for i in range(first, len(rows)):
+            dep, arr, from_id, to_id, _ = rows[i]
+            if target is not None and dep >= cur[target]:
+                break
+            ready = prev[from_id] if from_id == origin else prev[from_id] + min_transfer
+            if ready <= dep and arr < cur[to_id]:
+                cur[to_id] = arr
+                parent[to_id] = (k, i)
+        rounds.append((cur, parent))
+        if cur == prev:
+            break
+        prev, prev_parent = cur, parent
+    return rounds
+
+
+def trace_legs(connections, rounds, origin, stop_id, k):
+    """沿 parent 指標回推第 k 輪抵達 stop_id 的各段乘車"""
+    rows = connections["rows"]
+    legs = []
+    while stop_id != origin:
+        _, parent = rounds[k]
+        leg_round, i = parent[stop_id]
+        dep, arr, from_id, to_id, trip_id = rows[i]
+        legs.append({
+            **connections["trips"][trip_id],
+            'From': connections["stops"][from_id],
+            'To': connections["stops"][to_id],
+            'Departs': format_minutes(dep),
+            'Arrives': format_minutes(arr),
+        })
+        stop_id = from_id
+        k = leg_round - 1
+    legs.reverse()
+    return legs
+
+
+def plan_journeys(connections, start_stop, end_stop, earliest_minute,
+                  max_transfers=MAX_TRANSFERS, min_transfer=MIN_TRANSFER_MINUTES):
+    """回傳 start -> end 的 Pareto 最佳行程 (抵達時間 vs. 轉乘次數)
+
+    earliest_minute 為可搭乘的最早出發時間 (午夜起算分鐘數)。
+    """
+    stop_ids = connections["stop_ids"]
+    if start_stop == end_stop or start_stop not in stop_ids or end_stop not in stop_ids:
+        return []
+    origin, target = stop_ids[start_stop], stop_ids[end_stop]
+
+    rounds = scan_rounds(connections, origin, earliest_minute, max_transfers, min_transfer, target)
+
+    journeys = []
+    best = INF
+    for k, (arrival, _) in enumerate(rounds):
+        if arrival[target] >= best:
+            continue
+        best = arrival[target]
+        legs = trace_legs(connections, rounds, origin, target, k)
+        journeys.append({
+            'Transfers': len(legs) - 1,
+            'Departs': legs[0]['Departs'],
+            'Arrives': legs[-1]['Arrives'],
+            'Legs': legs,
+        })
+    return journeys
+
+
+# ==========================================
+# 🗺️ 可到達範圍 (isochrone)
+# ==========================================
+def reachable_within(connections, start_stop, earliest_minute, budget_minutes,
+                     max_transfers=MAX_TRANSFERS, min_transfer=MIN_TRANSFER_MINUTES):
+    """從 start_stop 出發、budget_minutes 分鐘內可抵達的所有站點
+
+    只掃一次依時間排序的 connection：每站保留「最多 k 次轉乘」的最早抵達時間 (k = 0..max_transfers)，
+    每筆 connection 從能最少搭乘段數上車的那一輪更新。回傳依抵達時間排序的列表。
+    """
+    stop_ids = connections["stop_ids"]
+    if start_stop not in stop_ids:
+        return []
+    origin = stop_ids[start_stop]
+    rows = connections["rows"]
+    n_stops = len(connections["stops"])
+    latest = earliest_minute + budget_minutes
+    n_labels = max_transfers + 1
+
+    # arrival[k][s]：最多搭 k + 1 段車抵達 s 的最早時間
+    arrival = [[INF] * n_stops for _ in range(n_labels)]
+    for k in range(n_labels):
+        arrival[k][origin] = earliest_minute
+    direct = arrival[0]
+
+    for i in range(bisect_left(connections["dep_list"], earliest_minute), len(rows)):
+        dep, arr, from_id, to_id, _ = rows[i]
+        if dep > latest:
+            break
+
+        # 直達 (k = 0) 那一層的時間最晚；連它都不會變快，其他層也不會
+        if arr >= direct[to_id]:
+            continue
+
+        # legs = 上車前已搭的段數 + 1；起點上車不需轉乘時間
+        if from_id == origin:
+            legs = 1
+        else:
+            legs = INF
+            for k in range(1, n_labels):
+                if arrival[k - 1][from_id] + min_transfer <= dep:
+                    legs = k + 1
+                    break
+            if legs > n_labels:
+                continue
+        for k in range(legs - 1, n_labels):
+            if arr < arrival[k][to_id]:
+                arrival[k][to_id] = arr
+
+    reachable = []
+    for stop_id, arrives in enumerate(arrival[-1]):
+        if stop_id == origin or arrives > latest:
+            continue
+        transfers = next(k for k in range(n_labels) if arrival[k][stop_id] == arrives)
+        reachable.append({
+            'Stop': connections["stops"][stop_id],
+            'Arrives': format_minutes(arrives),
+            'Minutes': arrives - earliest_minute,
+            'Transfers': transfers,
+        })
+    reachable.sort(key=lambda x: x['Minutes'])
+    return reachable
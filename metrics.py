@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter, time as wall_time
+
+# ==========================================
+# 📡 搜尋流程的計時與計數
+# ==========================================
+# 預設關閉；設定 HAKUBA_METRICS=1 (或呼叫 enable()) 才開始記錄。
+# 關閉時 stage() 回傳共用的空 context、inc() / observe() 直接 return，幾乎沒有成本。
+# 匯出：render_prometheus() (Prometheus text format)、snapshot() / dump_json() (JSON)。
+ENABLED = os.environ.get("HAKUBA_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("HAKUBA_METRICS_FILE")
+DUMP_INTERVAL_SECONDS = 10
+
+# 延遲分佈的 bucket 上限 (秒)
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}  # key -> [各 bucket 次數..., +Inf 次數], 總秒數, 次數
+_last_dump = 0.0
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        hist[0][bisect_left(BUCKETS, seconds)] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+
+class _Stage:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+def stage(name, **labels):
+    """計時區塊：with metrics.stage("sort"): ...  (記錄到 hakuba_stage_seconds)"""
+    if not ENABLED:
+        return _NOOP
+    return _Stage("stage_seconds", {"stage": name, **labels})
+
+
+def route_label(route_selection):
+    """路線標籤：智慧搜尋記為 smart，其餘取代號 (Line-V2 ...)"""
+    return "smart" if route_selection.startswith("🔍") else route_selection.split(' ')[0]
+
+
+# ==========================================
+# 📤 匯出
+# ==========================================
+def _quantile(counts, total, q):
+    """由 bucket 估計分位數 (取所在 bucket 的上限)"""
+    if not total:
+        return None
+    target = q * total
+    running = 0
+    for i, count in enumerate(counts):
+        running += count
+        if running >= target:
+            return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+    return float("inf")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()}
+
+    lines = []
+    for name in sorted({k[0] for k in counters}):
+        lines.append(f"# TYPE hakuba_{name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"hakuba_{name}{_format_labels(labels)} {value}")
+    for name in sorted({k[0] for k in histograms}):
+        lines.append(f"# TYPE hakuba_{name} histogram")
+        for (n, labels), (counts, total_seconds, count) in sorted(histograms.items()):
+            if n != name:
+                continue
+            running = 0
+            for bound, bucket_count in zip(BUCKETS + ("+Inf",), counts):
+                running += bucket_count
+                lines.append(f"hakuba_{name}_bucket{_format_labels(labels, [('le', bound)])} {running}")
+            lines.append(f"hakuba_{name}_sum{_format_labels(labels)} {total_seconds}")
+            lines.append(f"hakuba_{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """JSON 友善的摘要：計數 + 各階段的次數、平均與 p50 / p95 (毫秒)"""
+    with _lock:
+        counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_counters.items())]
+        histograms = []
+        for (n, l), (counts, total_seconds, count) in sorted(_histograms.items()):
+            p50, p95 = _quantile(counts, count, 0.5), _quantile(counts, count, 0.95)
+            histograms.append({
+                "name": n, "labels": dict(l), "count": count,
+                "mean_ms": round(total_seconds / count * 1000, 4),
+                "p50_ms": None if p50 in (None, float("inf")) else p50 * 1000,
+                "p95_ms": None if p95 in (None, float("inf")) else p95 * 1000,
+            })
+    return {"enabled": ENABLED, "counters": counters, "histograms": histograms}
+
+
+def dump_json(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def maybe_dump():
+    """有設定 HAKUBA_METRICS_FILE 時，最多每 DUMP_INTERVAL_SECONDS 秒寫一次 JSON"""
+    global _last_dump
+    if not ENABLED or not METRICS_FILE:
+        return
+    now = wall_time()
+    if now - _last_dump < DUMP_INTERVAL_SECONDS:
+        return
+    _last_dump = now
+    dump_json(METRICS_FILE)
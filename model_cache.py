@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+
+# ==========================================
+# 🗃️ 掛在 model 上的 LRU 快取
+# ==========================================
+# 快取存在 model[name] (OrderedDict)，時刻表重建 (換一個 model) 時自然失效。
+# 項目可帶到期時間 (monotonic 秒數)；查詢時才檢查，過期就刪除。
+# 查詢結果快取 (bus_search) 與看板矩陣快取 (board) 共用。
+_lock = threading.Lock()
+
+
+def lookup(model, name, key, now=None):
+    """回傳 (狀態, 值)；狀態為 "hit" / "miss" / "expired"，命中時標為最近使用"""
+    with _lock:
+        cache = model.setdefault(name, OrderedDict())
+        entry = cache.get(key)
+        if entry is None:
+            return "miss", None
+        expires_at, value = entry
+        if expires_at is not None and now is not None and now >= expires_at:
+            del cache[key]
+            return "expired", None
+        cache.move_to_end(key)
+        return "hit", value
+
+
+def store(model, name, key, value, max_entries, expires_at=None):
+    """存入 (或覆蓋) 一筆，超過 max_entries 時淘汰最久沒用的項目；回傳淘汰筆數"""
+    with _lock:
+        cache = model.setdefault(name, OrderedDict())
+        cache[key] = (expires_at, value)
+        cache.move_to_end(key)
+        evicted = 0
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+            evicted += 1
+    return evicted
+
+
+def size(model, name):
+    return len(model.get(name, ()))
@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bus_data import build_model  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def model():
+    return build_model()
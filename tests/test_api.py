@@ -0,0 +1,86 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from api import MAX_BODY_BYTES, BodyTooLarge, QueryError, handle_request, make_server, parse_content_length
+
+START = '白馬ハイランドホテル(Hakuba Highland Hotel)'
+END = 'エイブル白馬五竜いいもり(Goryu Iimori)'
+
+
+def post_batch(model, queries):
+    return handle_request(model, "POST", "/next/batch", body=json.dumps({"queries": queries}).encode())
+
+
+def test_batch_reports_non_string_fields_per_item(model):
+    status, payload = post_batch(model, [
+        {"start": ["x"], "end": "y"},
+        {"start": START, "end": END, "route": 5},
+        {"start": START, "end": END, "time": 830},
+        {"start": START, "end": END, "time": "08:30"},
+    ])
+    assert status == 200
+    results = payload["results"]
+    assert results[0] == {"error": "start 必須是字串"}
+    assert results[1] == {"error": "route 必須是字串"}
+    assert results[2] == {"error": "time 必須是字串"}
+    assert results[3]["results"]
+
+
+def test_batch_unknown_stop_is_item_error(model):
+    status, payload = post_batch(model, [{"start": "x", "end": END}])
+    assert status == 200
+    assert "error" in payload["results"][0]
+
+
+@pytest.mark.parametrize("value", ["abc", "-1", "1.5"])
+def test_parse_content_length_rejects_invalid(value):
+    with pytest.raises(QueryError):
+        parse_content_length(value)
+
+
+def test_parse_content_length_defaults_to_zero():
+    assert parse_content_length(None) == 0
+    assert parse_content_length("12") == 12
+    assert parse_content_length(str(MAX_BODY_BYTES)) == MAX_BODY_BYTES
+
+
+def test_parse_content_length_rejects_oversized_body():
+    with pytest.raises(BodyTooLarge):
+        parse_content_length(str(MAX_BODY_BYTES + 1))
+
+
+@pytest.fixture
+def server(model):
+    server = make_server(port=0, model=model)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post_with_content_length(server, value):
+    """只送標頭、不送 body：伺服器必須只看 Content-Length 就回應"""
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.putrequest("POST", "/next/batch")
+    conn.putheader("Content-Length", value)
+    conn.endheaders()
+    response = conn.getresponse()
+    status, payload = response.status, json.loads(response.read())
+    conn.close()
+    return status, payload
+
+
+def test_server_returns_400_for_bad_content_length(server):
+    status, payload = post_with_content_length(server, "abc")
+    assert status == 400
+    assert "Content-Length" in payload["error"]
+
+
+def test_server_returns_413_for_oversized_body(server):
+    status, payload = post_with_content_length(server, str(10 * 1024 ** 3))
+    assert status == 413
+    assert "過大" in payload["error"]
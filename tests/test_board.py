@@ -0,0 +1,33 @@
+from datetime import datetime, time
+
+import pytest
+
+from board import board_for, compute_departure_matrix, get_departure_matrix
+from bus_search import JST, SMART_SEARCH, find_bus_universal, get_japan_now
+
+FIELDS = ('Route', 'Bus_No', 'Direction', 'Departs', 'Arrives')
+
+
+@pytest.mark.parametrize("hour, minute", [(6, 0), (8, 29), (9, 0), (12, 45), (16, 59), (21, 30)])
+def test_board_matches_first_known_start_result(model, hour, minute):
+    when = datetime.combine(get_japan_now().date(), time(hour, minute)).replace(tzinfo=JST)
+    matrix = compute_departure_matrix(model, hour * 60 + minute)
+    stops = model["all_stops_combined"]
+
+    for start in stops:
+        board = {row['To']: tuple(row[f] for f in FIELDS) for row in board_for(matrix, start)}
+        for end in stops:
+            if end == start:
+                continue
+            known = [bus for bus in find_bus_universal(SMART_SEARCH, start, end, when, model)
+                     if not bus['Is_Unknown_Start']]
+            expected = tuple(known[0][f] for f in FIELDS) if known else None
+            assert board.get(end) == expected, (start, end)
+
+
+def test_departure_matrix_is_cached_per_minute(model):
+    model = {k: v for k, v in model.items() if k != "departure_matrix_cache"}
+    when = datetime(2026, 1, 15, 9, 0, tzinfo=JST)
+    first = get_departure_matrix(model, when)
+    assert get_departure_matrix(model, when.replace(second=40)) is first
+    assert get_departure_matrix(model, when.replace(minute=1)) is not first
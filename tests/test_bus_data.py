@@ -0,0 +1,24 @@
+import copy
+
+import pytest
+
+from bus_data import ROUTES, TIMETABLE_VERSION, timetable_version
+
+V2 = "Line-V2 (Cortina ⇄ Goryu)"
+E3 = "Line-E3 (Highland ⇄ Iwatake)"
+
+
+def test_version_is_stable():
+    assert timetable_version(copy.deepcopy(ROUTES)) == TIMETABLE_VERSION
+
+
+@pytest.mark.parametrize("edit", [
+    lambda routes: routes[V2].update(dir_s="往五龍方面"),
+    lambda routes: routes[E3]["stops_ret"].reverse(),
+    lambda routes: routes[V2]["south"]["SB_01"].reverse(),
+    lambda routes: routes.update({name: routes.pop(name) for name in [V2]}),
+])
+def test_any_route_change_changes_version(edit):
+    routes = copy.deepcopy(ROUTES)
+    edit(routes)
+    assert timetable_version(routes) != TIMETABLE_VERSION
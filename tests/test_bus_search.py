@@ -0,0 +1,83 @@
+from datetime import datetime, time
+
+import pytest
+
+import bus_search
+from bus_search import JST, SMART_SEARCH, find_bus_cached, find_bus_universal, get_japan_now, result_cache_stats
+
+HIGHLAND = '白馬ハイランドホテル(Hakuba Highland Hotel)'
+IIMORI = 'エイブル白馬五竜いいもり(Goryu Iimori)'
+ECHOLAND = 'Echoland (Spicy)'
+
+
+def at(hour, minute, second=0):
+    return datetime.combine(get_japan_now().date(), time(hour, minute, second)).replace(tzinfo=JST)
+
+
+@pytest.fixture
+def fresh_model(model):
+    """共用 model 的淺複本：不帶其他測試留下的快取"""
+    return {k: v for k, v in model.items() if k != "result_cache"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """固定快取用的時鐘；牆上時鐘停在某分鐘的第 10 秒"""
+    now = {"monotonic": 500.0, "wall": 60 * 1000 + 10.0}
+    monkeypatch.setattr(bus_search, "monotonic_time", lambda: now["monotonic"])
+    monkeypatch.setattr(bus_search, "wall_time", lambda: now["wall"])
+    return now
+
+
+def stats_delta(before):
+    after = result_cache_stats()
+    return {k: after[k] - before[k] for k in before}
+
+
+def test_hit_in_same_minute_matches_direct_search(fresh_model, clock):
+    first = find_bus_cached(SMART_SEARCH, HIGHLAND, IIMORI, at(8, 15, 0), fresh_model)
+    before = result_cache_stats()
+    cached = find_bus_cached(SMART_SEARCH, HIGHLAND, IIMORI, at(8, 15, 30), fresh_model)
+
+    assert stats_delta(before)["hits"] == 1
+    assert cached == find_bus_universal(SMART_SEARCH, HIGHLAND, IIMORI, at(8, 15, 30), fresh_model)
+    # 等候分鐘依實際秒數重算：同一班車，晚 30 秒查就少 1 分鐘
+    assert cached and int(first[0]['Wait_Time'].split()[0]) - int(cached[0]['Wait_Time'].split()[0]) == 1
+
+
+def test_cached_rows_are_copies(fresh_model, clock):
+    find_bus_cached(SMART_SEARCH, HIGHLAND, IIMORI, at(8, 15), fresh_model)[0]['Route'] = "changed"
+    assert find_bus_cached(SMART_SEARCH, HIGHLAND, IIMORI, at(8, 15), fresh_model)[0]['Route'] != "changed"
+
+
+def test_entry_expires_at_minute_boundary(fresh_model, clock):
+    find_bus_cached(SMART_SEARCH, HIGHLAND, IIMORI, at(8, 15), fresh_model)
+
+    clock["monotonic"] += 49.9
+    before = result_cache_stats()
+    find_bus_cached(SMART_SEARCH, HIGHLAND, IIMORI, at(8, 15), fresh_model)
+    assert stats_delta(before) == {"hits": 1, "misses": 0, "expired": 0, "evictions": 0}
+
+    clock["monotonic"] += 0.1
+    before = result_cache_stats()
+    find_bus_cached(SMART_SEARCH, HIGHLAND, IIMORI, at(8, 15), fresh_model)
+    assert stats_delta(before) == {"hits": 0, "misses": 1, "expired": 1, "evictions": 0}
+
+
+def test_lru_eviction_at_cache_size(fresh_model, clock, monkeypatch):
+    monkeypatch.setattr(bus_search, "RESULT_CACHE_SIZE", 3)
+    queries = [(HIGHLAND, IIMORI), (IIMORI, HIGHLAND), (HIGHLAND, ECHOLAND), (ECHOLAND, HIGHLAND)]
+
+    before = result_cache_stats()
+    for start, end in queries[:3]:
+        find_bus_cached(SMART_SEARCH, start, end, at(9, 0), fresh_model)
+    find_bus_cached(SMART_SEARCH, *queries[0], at(9, 0), fresh_model)  # 第一筆變成最近使用
+    find_bus_cached(SMART_SEARCH, *queries[3], at(9, 0), fresh_model)
+    assert stats_delta(before) == {"hits": 1, "misses": 4, "expired": 0, "evictions": 1}
+    assert result_cache_stats(fresh_model)["size"] == 3
+
+    # 被淘汰的是最久沒用的第二筆
+    before = result_cache_stats()
+    find_bus_cached(SMART_SEARCH, *queries[0], at(9, 0), fresh_model)
+    find_bus_cached(SMART_SEARCH, *queries[1], at(9, 0), fresh_model)
+    assert stats_delta(before)["hits"] == 1 and stats_delta(before)["misses"] == 1
@@ -0,0 +1,72 @@
+from datetime import datetime, time
+
+import pytest
+
+from bus_data import stops_v2
+from bus_search import SMART_SEARCH, JST, find_bus_universal, get_japan_now
+from journey import plan_journeys, reachable_within
+
+GORYU = stops_v2[-1]
+IWATAKE = '白馬岩岳(Iwatake)'
+JR_HAKUBA = 'JR白馬駅(JR Hakuba Sta.)'
+CORTINA = '白馬コルチナ(Cortina)'
+HAPPO = '八方尾根 (Happo-one)'
+
+
+def to_minutes(hhmm):
+    return int(hhmm[:2]) * 60 + int(hhmm[3:])
+
+
+def earliest_direct(model, start, end, minute):
+    """直達搜尋 (find_bus_universal) 中，抵達不早於出發的最早抵達時間"""
+    now = datetime.combine(get_japan_now().date(), time(minute // 60, minute % 60)).replace(tzinfo=JST)
+    arrivals = [
+        to_minutes(bus['Arrives']) for bus in find_bus_universal(SMART_SEARCH, start, end, now, model)
+        if not bus['Is_Unknown_Start'] and bus['Arrives'] >= bus['Departs']
+    ]
+    return min(arrivals, default=None)
+
+
+@pytest.mark.parametrize("start, end, minute, arrives", [
+    (GORYU, IWATAKE, 8 * 60 + 47, "09:28"),    # NB_09 經過時間倒退的 JR 白馬駅
+    (JR_HAKUBA, CORTINA, 8 * 60 + 50, "10:01"),
+])
+def test_planner_rides_through_out_of_order_cells(model, start, end, minute, arrives):
+    journeys = plan_journeys(model["connection_table"], start, end, minute)
+    assert (journeys[0]['Transfers'], journeys[0]['Arrives']) == (0, arrives)
+
+
+def test_isochrone_includes_direct_ride(model):
+    reachable = {r['Stop']: r for r in reachable_within(model["connection_table"], HAPPO, 13 * 60 + 47, 60)}
+    assert reachable[GORYU]['Arrives'] == "14:23"
+    assert reachable[GORYU]['Transfers'] == 0
+
+
+@pytest.mark.parametrize("minute", range(6 * 60, 23 * 60, 60))
+def test_zero_transfer_isochrone_matches_direct_search(model, minute):
+    connections = model["connection_table"]
+    for start in model["all_stops_combined"]:
+        reachable = {
+            r['Stop']: to_minutes(r['Arrives'])
+            for r in reachable_within(connections, start, minute + 1, 24 * 60, max_transfers=0)
+        }
+        for end in model["all_stops_combined"]:
+            if end != start:
+                assert reachable.get(end) == earliest_direct(model, start, end, minute), (start, end, minute)
+
+
+@pytest.mark.parametrize("minute", [7 * 60 + 30, 12 * 60, 16 * 60 + 45])
+def test_isochrone_matches_planner(model, minute):
+    connections = model["connection_table"]
+    for start in model["all_stops_combined"]:
+        reachable = {r['Stop']: r for r in reachable_within(connections, start, minute, 90)}
+        for end in model["all_stops_combined"]:
+            if end == start:
+                continue
+            journeys = [j for j in plan_journeys(connections, start, end, minute) if to_minutes(j['Arrives']) <= minute + 90]
+            if journeys:
+                best = journeys[-1]
+                assert reachable[end]['Arrives'] == best['Arrives'], (start, end, minute)
+                assert reachable[end]['Transfers'] == best['Transfers']
+            else:
+                assert end not in reachable
@@ -0,0 +1,46 @@
+import json
+import os
+
+import numpy as np
+
+from timetable import ARTIFACT_META, artifact_version, load_artifact, write_artifact
+
+
+def make_routes(base, n_cols=3):
+    stops = ["A", "B", "C"]
+    minutes = np.arange(len(stops) * n_cols, dtype=np.int16).reshape(len(stops), n_cols) + base
+    return [{
+        "name": "Line-T", "dir_s": "south", "dir_n": "north",
+        "directions": {"south": {"stops": stops, "bus_cols": [f"T_{i}" for i in range(n_cols)], "minutes": minutes}},
+    }]
+
+
+def minutes_files(path):
+    return sorted(name for name in os.listdir(path) if name.endswith(".npy"))
+
+
+def test_rebuild_does_not_touch_mapped_minutes(tmp_path):
+    write_artifact(tmp_path, make_routes(100), "v1")
+    _, old_network, _ = load_artifact(tmp_path)
+    old_minutes = old_network["Line-T"]["south"]["minutes"]
+    expected = np.array(old_minutes)
+
+    # 形狀不同的新版本寫進同一個目錄：舊的 mmap 仍然可讀、內容不變
+    write_artifact(tmp_path, make_routes(500, n_cols=5), "v2")
+    assert np.array_equal(old_minutes, expected)
+
+    _, new_network, version = load_artifact(tmp_path)
+    assert version == "v2" == artifact_version(tmp_path)
+    assert new_network["Line-T"]["south"]["minutes"].shape == (3, 5)
+    assert int(new_network["Line-T"]["south"]["minutes"][0, 0]) == 500
+
+
+def test_meta_points_at_published_minutes_and_old_files_are_pruned(tmp_path):
+    for i in range(4):
+        write_artifact(tmp_path, make_routes(i), f"v{i}")
+    with open(os.path.join(tmp_path, ARTIFACT_META), encoding="utf-8") as f:
+        meta = json.load(f)
+    files = minutes_files(tmp_path)
+    assert meta["minutes"] in files
+    assert len(files) == 2  # 新版 + 上一版
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,91 @@
+import os
+from datetime import date
+
+import pytest
+
+from timetable_import import TimetableError, main, read_csv, read_gtfs
+
+STOPS = "stop_id,stop_name\nA,Alpha\nB,Beta\n"
+TRIPS = (
+    "route_id,service_id,trip_id,direction_id,trip_short_name\n"
+    "R,WEEKDAY,wd-1,0,T_1\n"
+    "R,WEEKEND,we-1,0,T_1\n"
+)
+STOP_TIMES = (
+    "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+    "wd-1,08:00:00,08:00:00,A,1\n"
+    "wd-1,08:10:00,08:10:00,B,2\n"
+    "we-1,09:00:00,09:00:00,A,1\n"
+    "we-1,09:10:00,09:10:00,B,2\n"
+)
+CALENDAR = (
+    "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date\n"
+    "WEEKDAY,1,1,1,1,1,0,0,20260101,20261231\n"
+    "WEEKEND,0,0,0,0,0,1,1,20260101,20261231\n"
+)
+
+
+def write_gtfs(path, **files):
+    contents = {"stops.txt": STOPS, "trips.txt": TRIPS, "stop_times.txt": STOP_TIMES, "calendar.txt": CALENDAR}
+    contents.update(files)
+    for name, text in contents.items():
+        if text is not None:
+            with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+                f.write(text)
+    return str(path)
+
+
+def departures(trips):
+    return [trip["stops"][0][1] for trip in trips]
+
+
+def test_multiple_services_require_a_choice(tmp_path):
+    with pytest.raises(TimetableError, match="--service-id"):
+        read_gtfs(write_gtfs(tmp_path))
+
+
+def test_filter_by_service_id(tmp_path):
+    trips, errors = read_gtfs(write_gtfs(tmp_path), service_id="WEEKEND")
+    assert errors == []
+    assert departures(trips) == [9 * 60]
+
+
+def test_filter_by_date_uses_calendar_and_exceptions(tmp_path):
+    calendar_dates = "service_id,date,exception_type\nWEEKDAY,20261019,2\nWEEKEND,20261019,1\n"
+    gtfs_dir = write_gtfs(tmp_path, **{"calendar_dates.txt": calendar_dates})
+    assert departures(read_gtfs(gtfs_dir, service_date=date(2026, 10, 20))[0]) == [8 * 60]  # 週二
+    assert departures(read_gtfs(gtfs_dir, service_date=date(2026, 10, 18))[0]) == [9 * 60]  # 週日
+    assert departures(read_gtfs(gtfs_dir, service_date=date(2026, 10, 19))[0]) == [9 * 60]  # 例外：改開假日班
+
+
+def test_bad_stop_sequence_is_reported_per_row(tmp_path):
+    stop_times = STOP_TIMES.replace("wd-1,08:10:00,08:10:00,B,2", "wd-1,08:10:00,08:10:00,B,two")
+    _, errors = read_gtfs(write_gtfs(tmp_path, **{"stop_times.txt": stop_times}), service_id="WEEKDAY")
+    assert len(errors) == 1 and "stop_sequence" in errors[0]
+
+
+@pytest.mark.parametrize("files, message", [
+    ({"stop_times.txt": None}, "缺少檔案：stop_times.txt"),
+    ({"stops.txt": "stop_name\nAlpha\n"}, "stops.txt 缺少欄位：stop_id"),
+])
+def test_broken_gtfs_raises_timetable_error(tmp_path, files, message):
+    with pytest.raises(TimetableError, match=message):
+        read_gtfs(write_gtfs(tmp_path, **files), service_id="WEEKDAY")
+
+
+def test_main_reports_errors_without_traceback(tmp_path, capsys):
+    gtfs_dir = write_gtfs(tmp_path, **{"stop_times.txt": None})
+    assert main(["gtfs", gtfs_dir, "--service-id", "WEEKDAY", "-o", str(tmp_path / "out")]) == 1
+    assert "缺少檔案：stop_times.txt" in capsys.readouterr().err
+    assert main(["gtfs", write_gtfs(tmp_path), "--date", "2026-10-20", "-o", str(tmp_path / "out")]) == 0
+
+
+@pytest.mark.parametrize("text, message", [
+    ("route,direction,trip,stop,time\n", "CSV 沒有資料"),
+    ("route,trip,stop\nR,T_1,A\n", "CSV 缺少欄位：direction, time"),
+])
+def test_csv_header_problems(tmp_path, text, message):
+    path = tmp_path / "timetable.csv"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(TimetableError, match=message):
+        read_csv(str(path))
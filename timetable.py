@@ -0,0 +1,220 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# ==========================================
+# ⚡ 編譯時刻表 (整數分鐘矩陣)
+# ==========================================
+# 每條路線、每個方向編譯成一個 int16 矩陣：列 = 站點、欄 = 班次，
+# 值為午夜起算的分鐘數，沒有停靠的格子填 NO_TIME。
+NO_TIME = -1
+
+
+def to_minutes(time_str):
+    """'HH:MM' -> 午夜起算分鐘數，NaN 回傳 NO_TIME"""
+    if not isinstance(time_str, str):
+        return NO_TIME
+    hh, mm = time_str.split(':')
+    return int(hh) * 60 + int(mm)
+
+
+def format_minutes(minutes):
+    """分鐘數 -> 'HH:MM'"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def compile_direction(schedule, reverse=False):
+    """將單一方向的時刻表 ({'Stop_Name': [...], 班次: [...]}) 轉成整數分鐘矩陣
+
+    直接讀原始 dict，不經過 pandas。
+    reverse=True 表示列順序與行駛方向相反 (V2/VN 回程共用去程站序)。
+    """
+    stops = schedule['Stop_Name']
+    bus_cols = [col for col in schedule if col != 'Stop_Name']
+    minutes = np.array(
+        [[to_minutes(schedule[col][i]) for col in bus_cols] for i in range(len(stops))],
+        dtype=np.int16
+    ).reshape(len(stops), len(bus_cols))
+    return {
+        "minutes": minutes,
+        "stop_rows": {stop: i for i, stop in enumerate(stops)},
+        "stop_seq": {stop: (-i if reverse else i) for i, stop in enumerate(stops)},
+        "bus_cols": bus_cols,
+        "bus_nos": [col.split('_')[-1] for col in bus_cols],
+    }
+
+
+def compile_network(routes):
+    """整個路線表 (bus_data.ROUTES) 編譯一次，搜尋時只做陣列運算"""
+    return {
+        route_name: {
+            "south": compile_direction(route_data["south"]),
+            "north": compile_direction(route_data["north"], reverse="stops_ret" not in route_data),
+        }
+        for route_name, route_data in routes.items()
+    }
+
+
+
+# ==========================================
+# 🗂️ 站點反查索引 (stop -> route / 方向 / 列)
+# ==========================================
+def build_stop_index(compiled_network):
+    """每個站點對應到所有停靠它的 (路線, 方向) 與該方向的行駛順序"""
+    stop_index = {}
+    for route_name, directions in compiled_network.items():
+        for direction_key, compiled in directions.items():
+            for stop, seq in compiled["stop_seq"].items():
+                stop_index.setdefault(stop, {})[(route_name, direction_key)] = seq
+    return stop_index
+
+
+def matching_directions(stop_index, start_stop, end_stop, route_name=None):
+    """列出同時停靠兩站、且行駛方向為 start -> end 的 (路線, 方向)
+
+    只看起點索引中的路線，方向由 O(1) 的站序比較決定；順序與 bus_network 相同。
+    """
+    end_entries = stop_index.get(end_stop, {})
+    matches = []
+    for key, start_seq in stop_index.get(start_stop, {}).items():
+        if route_name is not None and key[0] != route_name:
+            continue
+        end_seq = end_entries.get(key)
+        if end_seq is not None and start_seq < end_seq:
+            matches.append(key)
+    return matches
+
+
+def is_row_empty(direction, stop):
+    """該站在此方向完全沒有時刻 (F6/G7 按鈴停靠站)"""
+    return bool((direction["minutes"][direction["stop_rows"][stop]] == NO_TIME).all())
+
+
+def next_departures(direction, start_stop, end_stop, after_seconds):
+    """回傳出發時間晚於 after_seconds (午夜起算秒數) 且兩站皆有停靠的班次欄位"""
+    minutes = direction["minutes"]
+    dep = minutes[direction["stop_rows"][start_stop]]
+    arr = minutes[direction["stop_rows"][end_stop]]
+    mask = (dep != NO_TIME) & (arr != NO_TIME) & (dep.astype(np.int32) * 60 > after_seconds)
+    return np.flatnonzero(mask)
+
+
+def arrivals_at(direction, end_stop):
+    """回傳終點有時刻的所有班次欄位 (起點時間未知時使用)"""
+    return np.flatnonzero(direction["minutes"][direction["stop_rows"][end_stop]] != NO_TIME)
+
+
+
+# ==========================================
+# 💾 編譯後的時刻表檔 (memory-map)
+# ==========================================
+# 目錄內含 minutes-*.npy (所有方向的矩陣串成一條 int16 陣列) 與 meta.json (站點、班次、位移、矩陣檔名)。
+# 以 mmap 開啟，多個 worker 共用同一份 page cache，啟動時不必建立 DataFrame。
+# 存檔時每個方向的列順序即行駛順序。
+# 重建時矩陣一律寫成新檔名，最後才 os.replace 換上 meta.json：執行中的 worker 還 mmap 著舊檔，
+# 舊檔絕不能被改寫或截斷 (否則讀取時 SIGBUS)，讀者也永遠拿到互相對應的 meta 與矩陣。
+ARTIFACT_FORMAT = 2
+ARTIFACT_META = "meta.json"
+
+
+def _read_meta(path):
+    with open(os.path.join(path, ARTIFACT_META), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_new(path, prefix, suffix, write):
+    """寫到 path 目錄下一個全新的檔名 (權限 644)，回傳檔名"""
+    fd, tmp_path = tempfile.mkstemp(dir=path, prefix=prefix, suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return os.path.basename(tmp_path)
+
+
+def write_artifact(path, routes, version):
+    """routes: [{"name", "dir_s", "dir_n", "directions": {"south"/"north": {"stops", "bus_cols", "minutes"}}}]"""
+    os.makedirs(path, exist_ok=True)
+    chunks = []
+    offset = 0
+    meta_routes = []
+    for route in routes:
+        meta_directions = {}
+        for direction_key, direction in route["directions"].items():
+            minutes = np.asarray(direction["minutes"], dtype=np.int16)
+            meta_directions[direction_key] = {
+                "stops": direction["stops"],
+                "bus_cols": direction["bus_cols"],
+                "offset": offset,
+                "shape": list(minutes.shape),
+            }
+            chunks.append(minutes.ravel())
+            offset += minutes.size
+        meta_routes.append({
+            "name": route["name"], "dir_s": route["dir_s"], "dir_n": route["dir_n"],
+            "directions": meta_directions,
+        })
+
+    try:
+        previous = _read_meta(path)["minutes"]
+    except FileNotFoundError:
+        previous = None
+
+    flat = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int16)
+    minutes_file = _write_new(path, "minutes-", ".npy", lambda f: np.save(f, flat))
+    meta = {"format": ARTIFACT_FORMAT, "version": version, "minutes": minutes_file, "routes": meta_routes}
+    meta_tmp = _write_new(path, "meta-", ".tmp", lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode()))
+    os.replace(os.path.join(path, meta_tmp), os.path.join(path, ARTIFACT_META))
+
+    # 保留新檔與上一版 (剛讀完舊 meta 的 worker 可能還沒打開它)，更早的才刪；
+    # 已 mmap 的檔案刪除後內容仍在，不影響執行中的 worker
+    for name in os.listdir(path):
+        is_minutes = name.startswith("minutes-") and name.endswith(".npy")
+        if is_minutes and name not in (minutes_file, previous):
+            os.remove(os.path.join(path, name))
+
+
+def artifact_version(path):
+    return _read_meta(path)["version"]
+
+
+def load_artifact(path):
+    """以 mmap 載入時刻表檔，回傳 (路線資訊, compiled_network, 時刻表版本)
+
+    路線資訊的格式與 bus_network 相同 (stops / stops_ret / dir_s / dir_n)，但不含 DataFrame。
+    """
+    meta = _read_meta(path)
+    if meta.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"不支援的時刻表檔格式：{meta.get('format')!r}")
+    flat = np.load(os.path.join(path, meta["minutes"]), mmap_mode="r")
+
+    routes = {}
+    compiled_network = {}
+    for route in meta["routes"]:
+        directions = {}
+        for direction_key, direction in route["directions"].items():
+            n_rows, n_cols = direction["shape"]
+            start = direction["offset"]
+            stops = direction["stops"]
+            directions[direction_key] = {
+                "minutes": flat[start:start + n_rows * n_cols].reshape(n_rows, n_cols),
+                "stop_rows": {stop: i for i, stop in enumerate(stops)},
+                "stop_seq": {stop: i for i, stop in enumerate(stops)},
+                "bus_cols": direction["bus_cols"],
+                "bus_nos": [col.split('_')[-1] for col in direction["bus_cols"]],
+            }
+        compiled_network[route["name"]] = directions
+        # 單向路線只有一個方向，另一邊的站點清單留空
+        routes[route["name"]] = {
+            "stops": route["directions"].get("south", {}).get("stops", []),
+            "stops_ret": route["directions"].get("north", {}).get("stops", []),
+            "dir_s": route["dir_s"], "dir_n": route["dir_n"],
+        }
+    return routes, compiled_network, meta["version"]
@@ -0,0 +1,435 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from timetable import NO_TIME, format_minutes, write_artifact
+
+# ==========================================
+# 📥 時刻表匯入 (GTFS / CSV -> 編譯後的時刻表檔)
+# ==========================================
+# python timetable_import.py gtfs <gtfs 資料夾> -o build/timetable [--service-id ID | --date YYYY-MM-DD]
+# python timetable_import.py csv <timetable.csv> -o build/timetable
+# python timetable_import.py builtin -o build/timetable --drop-invalid   (由程式內建的時刻表產生)
+# python timetable_import.py export-csv <timetable.csv>                  (內建時刻表輸出成 CSV 方便編輯)
+#
+# CSV 欄位：route, direction (south / north), direction_label, trip, stop, time (HH:MM)[, stop_sequence]
+# 產生的檔案由 HAKUBA_TIMETABLE=<資料夾> 指定給 app.py / api.py 使用。
+DIRECTIONS = ("south", "north")
+GTFS_DIRECTIONS = {"0": "south", "1": "north"}
+MAX_MINUTES = 48 * 60 - 1  # GTFS 允許 24:xx 以後的跨午夜時刻
+CSV_FIELDS = ["route", "direction", "direction_label", "trip", "stop", "time", "stop_sequence"]
+
+
+class TimetableError(ValueError):
+    """時刻表內容有誤，無法產生時刻表檔"""
+
+
+def parse_clock(value):
+    """'HH:MM' 或 'HH:MM:SS' -> 分鐘數；空白回傳 None (該站不停或非計時點)"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    parts = value.split(':')
+    if len(parts) not in (2, 3) or not all(p.isdigit() for p in parts):
+        raise ValueError(f"時間格式錯誤：{value!r}")
+    minutes = int(parts[0]) * 60 + int(parts[1])
+    if int(parts[1]) >= 60 or minutes > MAX_MINUTES:
+        raise ValueError(f"時間超出範圍：{value!r}")
+    return minutes
+
+
+# ==========================================
+# 📖 讀取來源 (統一轉成 trip 列表)
+# ==========================================
+# trip = {"route", "direction", "label", "trip", "stops": [(站名, 分鐘數或 None), ...] (行駛順序)}
+def _read_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+def _group_trips(rows, errors):
+    """把逐站的資料列依 (route, direction, trip) 分組，並依 stop_sequence 排序"""
+    trips = {}
+    for line_no, row in rows:
+        key = (row["route"], row["direction"], row["trip"])
+        trip = trips.setdefault(key, {
+            "route": row["route"], "direction": row["direction"], "label": row.get("label") or "",
+            "trip": row["trip"], "stops": [],
+        })
+        if row.get("label") and not trip["label"]:
+            trip["label"] = row["label"]
+        try:
+            minutes = parse_clock(row["time"])
+        except ValueError as e:
+            errors.append(f"第 {line_no} 列 {row['trip']} {row['stop']}：{e}")
+            continue
+        trip["stops"].append((row["sequence"], row["stop"], minutes))
+
+    result = []
+    for trip in trips.values():
+        trip["stops"] = [(stop, minutes) for _, stop, minutes in sorted(trip["stops"], key=lambda x: x[0])]
+        result.append(trip)
+    return result
+
+
+def read_csv(csv_path):
+    rows = _read_rows(csv_path)
+    if not rows:
+        raise TimetableError("CSV 沒有資料")
+    missing = {"route", "direction", "trip", "stop", "time"} - set(rows[0])
+    if missing:
+        raise TimetableError(f"CSV 缺少欄位：{', '.join(sorted(missing))}")
+
+    errors = []
+    normalized = []
+    for i, row in enumerate(rows):
+        line_no = i + 2
+        sequence = row.get("stop_sequence") or ""
+        normalized.append((line_no, {
+            "route": row["route"], "direction": row["direction"], "label": row.get("direction_label", ""),
+            "trip": row["trip"], "stop": row["stop"], "time": row["time"],
+            # 沒有 stop_sequence 時依檔案中的順序
+            "sequence": int(sequence) if sequence.strip().isdigit() else i,
+        }))
+    return _group_trips(normalized, errors), errors
+
+
+GTFS_REQUIRED = {
+    "stops.txt": {"stop_id"},
+    "trips.txt": {"route_id", "service_id", "trip_id"},
+    "stop_times.txt": {"trip_id", "stop_id", "stop_sequence"},
+}
+GTFS_OPTIONAL = {
+    "routes.txt": {"route_id"},
+    "calendar.txt": {"service_id", "start_date", "end_date", "monday", "tuesday", "wednesday",
+                     "thursday", "friday", "saturday", "sunday"},
+    "calendar_dates.txt": {"service_id", "date", "exception_type"},
+}
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+def _read_gtfs_file(gtfs_dir, name):
+    """讀取一個 GTFS 檔並檢查必要欄位；選用檔案不存在時回傳 None"""
+    path = os.path.join(gtfs_dir, name)
+    if not os.path.exists(path):
+        if name in GTFS_REQUIRED:
+            raise TimetableError(f"GTFS 缺少檔案：{name}")
+        return None
+    rows = _read_rows(path)
+    columns = set(rows[0]) if rows else set()
+    missing = (GTFS_REQUIRED.get(name) or GTFS_OPTIONAL[name]) - columns
+    if rows and missing:
+        raise TimetableError(f"{name} 缺少欄位：{', '.join(sorted(missing))}")
+    return rows
+
+
+def parse_service_date(value):
+    """'YYYY-MM-DD' 或 'YYYYMMDD' -> date"""
+    try:
+        return datetime.strptime(value.replace("-", ""), "%Y%m%d").date()
+    except ValueError:
+        raise TimetableError(f"日期格式錯誤：{value!r}，請使用 YYYY-MM-DD")
+
+
+def active_services(calendar, calendar_dates, day):
+    """calendar.txt + calendar_dates.txt 中 day 當天行駛的 service_id"""
+    services = set()
+    for row in calendar or []:
+        start, end = parse_service_date(row["start_date"]), parse_service_date(row["end_date"])
+        if start <= day <= end and row[WEEKDAYS[day.weekday()]] == "1":
+            services.add(row["service_id"])
+    for row in calendar_dates or []:
+        if parse_service_date(row["date"]) != day:
+            continue
+        if row["exception_type"] == "1":
+            services.add(row["service_id"])
+        elif row["exception_type"] == "2":
+            services.discard(row["service_id"])
+    return services
+
+
+def read_gtfs(gtfs_dir, service_id=None, service_date=None):
+    """讀取 GTFS 的 routes / trips / stops / stop_times
+
+    時刻表檔只描述一天的班次，所以只取一組 service：以 service_id 指定、
+    或由 service_date 依 calendar / calendar_dates 決定；都沒指定時 GTFS 只能有一種 service_id。
+    """
+    route_names = {}
+    for row in _read_gtfs_file(gtfs_dir, "routes.txt") or []:
+        route_names[row["route_id"]] = row.get("route_long_name") or row.get("route_short_name") or row["route_id"]
+    stop_names = {row["stop_id"]: row.get("stop_name") or row["stop_id"] for row in _read_gtfs_file(gtfs_dir, "stops.txt")}
+    trip_rows = _read_gtfs_file(gtfs_dir, "trips.txt")
+
+    services = {row["service_id"] for row in trip_rows}
+    if service_date is not None:
+        wanted = active_services(_read_gtfs_file(gtfs_dir, "calendar.txt"),
+                                 _read_gtfs_file(gtfs_dir, "calendar_dates.txt"), service_date)
+        if not wanted & services:
+            raise TimetableError(f"{service_date.isoformat()} 沒有行駛的 service")
+    elif service_id is not None:
+        if service_id not in services:
+            raise TimetableError(f"trips.txt 中沒有 service_id {service_id!r}")
+        wanted = {service_id}
+    elif len(services) > 1:
+        raise TimetableError(
+            f"GTFS 含有多種 service_id ({', '.join(sorted(services))})，請以 --service-id 或 --date 指定一種"
+        )
+    else:
+        wanted = services
+    trip_info = {row["trip_id"]: row for row in trip_rows if row["service_id"] in wanted}
+    other_trips = {row["trip_id"] for row in trip_rows} - set(trip_info)
+
+    errors = []
+    normalized = []
+    for i, row in enumerate(_read_gtfs_file(gtfs_dir, "stop_times.txt")):
+        line_no = i + 2
+        if row["trip_id"] in other_trips:
+            continue
+        trip = trip_info.get(row["trip_id"])
+        if trip is None:
+            errors.append(f"stop_times.txt 第 {line_no} 列：trips.txt 中沒有 trip_id {row['trip_id']!r}")
+            continue
+        if row["stop_id"] not in stop_names:
+            errors.append(f"stop_times.txt 第 {line_no} 列：stops.txt 中沒有 stop_id {row['stop_id']!r}")
+            continue
+        if not (row["stop_sequence"] or "").strip().isdigit():
+            errors.append(f"stop_times.txt 第 {line_no} 列：stop_sequence 必須是整數：{row['stop_sequence']!r}")
+            continue
+        normalized.append((line_no, {
+            "route": route_names.get(trip["route_id"], trip["route_id"]),
+            "direction": GTFS_DIRECTIONS.get(trip.get("direction_id") or "0", trip.get("direction_id")),
+            "label": trip.get("trip_headsign", ""),
+            "trip": trip.get("trip_short_name") or row["trip_id"],
+            "stop": stop_names[row["stop_id"]],
+            "time": row.get("departure_time") or row.get("arrival_time"),
+            "sequence": int(row["stop_sequence"]),
+        }))
+    return _group_trips(normalized, errors), errors
+
+
+def builtin_trips():
+    """程式內建 (bus_data) 的時刻表轉成 trip 列表；V2 / VN 回程的站序要反過來"""
+    from bus_data import ROUTES
+
+    trips = []
+    for route_name, route_data in ROUTES.items():
+        for direction_key in DIRECTIONS:
+            schedule = route_data[direction_key]
+            label = route_data['dir_s'] if direction_key == "south" else route_data['dir_n']
+            reverse = direction_key == "north" and "stops_ret" not in route_data
+            stops = schedule['Stop_Name'][::-1] if reverse else schedule['Stop_Name']
+            for col, times in schedule.items():
+                if col == 'Stop_Name':
+                    continue
+                times = times[::-1] if reverse else times
+                trips.append({
+                    "route": route_name, "direction": direction_key, "label": label, "trip": col,
+                    "stops": [(stop, parse_clock(t) if isinstance(t, str) else None) for stop, t in zip(stops, times)],
+                })
+    return trips, []
+
+
+# ==========================================
+# ✅ 檢查
+# ==========================================
+def _keep_monotonic(times):
+    """最長非遞減子序列的索引 (用來找出時間倒退、應移除的站)"""
+    best = [1] * len(times)
+    prev = [-1] * len(times)
+    for i in range(len(times)):
+        for j in range(i):
+            if times[j] <= times[i] and best[j] + 1 > best[i]:
+                best[i], prev[i] = best[j] + 1, j
+    keep = set()
+    i = max(range(len(times)), key=best.__getitem__) if times else -1
+    while i != -1:
+        keep.add(i)
+        i = prev[i]
+    return keep
+
+
+def validate(trips, drop_invalid=False):
+    """回傳 (可用的 trips, 錯誤, 警告)
+
+    時間倒退的班次 (例如 V2 SB_11 的 Hakuba 47 早於 Echoland) 預設視為錯誤；
+    drop_invalid=True 時改為移除倒退的那幾站並列為警告。
+    """
+    errors, warnings = [], []
+    valid = []
+    seen = set()
+    for trip in trips:
+        name = f"{trip['route']} {trip['direction']} {trip['trip']}"
+        if trip["direction"] not in DIRECTIONS:
+            errors.append(f"{name}：方向必須是 south 或 north")
+            continue
+        if (trip["route"], trip["direction"], trip["trip"]) in seen:
+            errors.append(f"{name}：班次重複")
+            continue
+        seen.add((trip["route"], trip["direction"], trip["trip"]))
+
+        stop_names = [stop for stop, _ in trip["stops"]]
+        if len(set(stop_names)) != len(stop_names):
+            errors.append(f"{name}：同一班次重複停靠同一站")
+            continue
+        timed = [(i, minutes) for i, (_, minutes) in enumerate(trip["stops"]) if minutes is not None]
+        if len(timed) < 2:
+            warnings.append(f"{name}：少於兩個有時刻的站，略過")
+            continue
+
+        keep = _keep_monotonic([minutes for _, minutes in timed])
+        if len(keep) < len(timed):
+            dropped = [trip["stops"][timed[k][0]] for k in range(len(timed)) if k not in keep]
+            detail = "、".join(f"{stop} {format_minutes(minutes)}" for stop, minutes in dropped)
+            if not drop_invalid:
+                errors.append(f"{name}：時間倒退 ({detail})")
+                continue
+            warnings.append(f"{name}：時間倒退，已移除 {detail}")
+            dropped_rows = {timed[k][0] for k in range(len(timed)) if k not in keep}
+            trip = {**trip, "stops": [
+                (stop, None if i in dropped_rows else minutes) for i, (stop, minutes) in enumerate(trip["stops"])
+            ]}
+        valid.append(trip)
+    return valid, errors, warnings
+
+
+def stop_order(trips):
+    """合併同一方向所有班次的站序 (拓撲排序，同層依首次出現順序)"""
+    first_seen = {}
+    edges = {}
+    indegree = {}
+    for trip in trips:
+        names = [stop for stop, _ in trip["stops"]]
+        for stop in names:
+            if stop not in first_seen:
+                first_seen[stop] = len(first_seen)
+                edges[stop] = set()
+                indegree[stop] = 0
+        for a, b in zip(names, names[1:]):
+            if b not in edges[a]:
+                edges[a].add(b)
+                indegree[b] += 1
+
+    order = []
+    ready = sorted((s for s, d in indegree.items() if d == 0), key=first_seen.get)
+    while ready:
+        stop = ready.pop(0)
+        order.append(stop)
+        for nxt in edges[stop]:
+            indegree[nxt] -= 1
+            if indegree[nxt] == 0:
+                ready.append(nxt)
+        ready.sort(key=first_seen.get)
+    if len(order) != len(first_seen):
+        route, direction = trips[0]["route"], trips[0]["direction"]
+        raise TimetableError(f"{route} {direction}：各班次的站序互相矛盾")
+    return order
+
+
+def assemble(trips):
+    """trip 列表 -> write_artifact 需要的路線結構"""
+    routes = {}
+    for trip in trips:
+        route = routes.setdefault(trip["route"], {"name": trip["route"], "dir_s": "", "dir_n": "", "trips": {}})
+        label_key = "dir_s" if trip["direction"] == "south" else "dir_n"
+        if not route[label_key]:
+            route[label_key] = trip["label"]
+        route["trips"].setdefault(trip["direction"], []).append(trip)
+
+    result = []
+    for route in routes.values():
+        directions = {}
+        for direction_key in DIRECTIONS:
+            direction_trips = route["trips"].get(direction_key)
+            if not direction_trips:
+                continue
+            stops = stop_order(direction_trips)
+            rows = {stop: i for i, stop in enumerate(stops)}
+            minutes = np.full((len(stops), len(direction_trips)), NO_TIME, dtype=np.int16)
+            for col, trip in enumerate(direction_trips):
+                for stop, value in trip["stops"]:
+                    if value is not None:
+                        minutes[rows[stop], col] = value
+            directions[direction_key] = {
+                "stops": stops,
+                "bus_cols": [trip["trip"] for trip in direction_trips],
+                "minutes": minutes,
+            }
+        result.append({"name": route["name"], "dir_s": route["dir_s"], "dir_n": route["dir_n"], "directions": directions})
+    return result
+
+
+def trips_version(trips):
+    payload = json.dumps(trips, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def write_csv(trips, csv_path):
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for trip in trips:
+            for sequence, (stop, minutes) in enumerate(trip["stops"]):
+                writer.writerow({
+                    "route": trip["route"], "direction": trip["direction"], "direction_label": trip["label"],
+                    "trip": trip["trip"], "stop": stop,
+                    "time": "" if minutes is None else format_minutes(minutes),
+                    "stop_sequence": sequence,
+                })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="匯入時刻表並編譯成 memory-map 檔")
+    sub = parser.add_subparsers(dest="source", required=True)
+    for name, help_text in (("gtfs", "GTFS 資料夾"), ("csv", "CSV 檔")):
+        p = sub.add_parser(name)
+        p.add_argument("path", help=help_text)
+    sub.add_parser("builtin")
+    service = sub.choices["gtfs"].add_mutually_exclusive_group()
+    service.add_argument("--service-id", help="只匯入這個 service_id 的班次")
+    service.add_argument("--date", help="只匯入這一天 (依 calendar / calendar_dates) 行駛的班次")
+    export = sub.add_parser("export-csv")
+    export.add_argument("path", help="輸出的 CSV 檔")
+    for p in sub.choices.values():
+        if p is not export:
+            p.add_argument("-o", "--output", default=os.path.join("build", "timetable"))
+            p.add_argument("--drop-invalid", action="store_true", help="移除時間倒退的站，而不是整批拒絕")
+    args = parser.parse_args(argv)
+
+    if args.source == "export-csv":
+        trips, _ = builtin_trips()
+        write_csv(trips, args.path)
+        print(f"已輸出 {len(trips)} 個班次：{args.path}")
+        return 0
+
+    try:
+        if args.source == "gtfs":
+            service_date = parse_service_date(args.date) if args.date else None
+            trips, errors = read_gtfs(args.path, args.service_id, service_date)
+        elif args.source == "csv":
+            trips, errors = read_csv(args.path)
+        else:
+            trips, errors = builtin_trips()
+        trips, check_errors, warnings = validate(trips, args.drop_invalid)
+        errors += check_errors
+        for message in warnings:
+            print(f"⚠️ {message}")
+        if errors:
+            raise TimetableError("\n".join(errors))
+        routes = assemble(trips)
+    except TimetableError as e:
+        print(f"❌ 時刻表有誤，未產生檔案：\n{e}", file=sys.stderr)
+        return 1
+
+    write_artifact(args.output, routes, trips_version(trips))
+    print(f"已產生 {args.output}：{len(routes)} 條路線、{len(trips)} 個班次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())